@@ -0,0 +1,38 @@
+import argparse
+import json
+
+from benchmarks.scenarios import SCENARIOS, run_scenario
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run end-to-end scenarios against local stand-ins for the services.")
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--service", nargs="+", choices=["pandora", "ytm"], default=["pandora", "ytm"])
+    parser.add_argument("--releases", nargs="+", type=int, default=[10, 100, 1000],
+            help="Release groups per artist. Default: %(default)s.")
+    parser.add_argument("--artists", type=int, default=3, help="Default: %(default)s.")
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds added to every request. Default: %(default)s.")
+    parser.add_argument("--musicbrainz-rate", type=float,
+            help="Requests per second the fake MusicBrainz allows, and the client is limited to. Unlimited by default.")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests failing with 503. Default: %(default)s.")
+    parser.add_argument("--json", action="store_true", help="Print each result as a line of JSON.")
+    args = parser.parse_args()
+
+    if not args.json:
+        print(f"{'scenario':<16} {'service':<8} {'releases':>8} {'wall (s)':>9} {'peak (MiB)':>10} {'MB reqs':>8} {'svc reqs':>8}  error")
+
+    for scenario in args.scenario:
+        for service_name in args.service:
+            for releases in args.releases:
+                result = run_scenario(scenario, service_name, artists=args.artists, releases=releases, latency=args.latency,
+                        musicbrainz_rate=args.musicbrainz_rate, error_rate=args.error_rate)
+                if args.json:
+                    print(json.dumps(result), flush=True)
+                else:
+                    service_requests = result["requests"]["pandora" if service_name == "pandora" else "ytmusic"]
+                    print(f"{scenario:<16} {service_name:<8} {releases:>8} {result['wall_time']:>9.2f} {result['peak_memory'] / 2 ** 20:>10.1f} "
+                          f"{result['requests']['musicbrainz']:>8} {service_requests:>8}  {result['error'] or ''}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
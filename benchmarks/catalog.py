@@ -0,0 +1,51 @@
+import random
+
+PRIMARY_TYPES = ("Album", "Album", "Album", "EP", "Single")
+SECONDARY_TYPES = ([], [], [], [], ["Live"], ["Compilation"], ["Remix"], ["Soundtrack"])
+
+
+def _mbid(kind, *nums):
+    # Looks enough like a MusicBrainz ID to pass as one.
+    digits = "".join(f"{num:04x}" for num in nums).rjust(24, "0")[-24:]
+    return f"{kind:0>8}"[-8:] + f"-{digits[:4]}-{digits[4:8]}-{digits[8:12]}-{digits[12:]}"
+
+
+# A synthetic music catalog shared by the fake services, so the same artists
+# and albums can be found on each of them.
+class Catalog:
+    def __init__(self, artists=1, releases=100, tracks_per_release=10, seed=0):
+        rand = random.Random(seed)
+
+        self.artists = []
+        self.release_groups = {}
+        for artist_num in range(artists):
+            artist = {
+                "id": _mbid("a", artist_num),
+                "name": f"Bench Artist {artist_num}",
+                "pandora_id": f"AR:{artist_num}",
+                "channel_id": f"UCbench{artist_num:06d}"
+            }
+            self.artists.append(artist)
+
+            self.release_groups[artist["id"]] = [{
+                "id": _mbid("b", artist_num, release_num),
+                "title": f"{artist['name']} Release {release_num}",
+                "primary-type": rand.choice(PRIMARY_TYPES),
+                "secondary-types": list(rand.choice(SECONDARY_TYPES)),
+                "first-release-date": f"{1960 + rand.randrange(60)}-{rand.randrange(1, 13):02d}-01",
+                "artist-credit": [{"name": artist["name"], "artist": {"id": artist["id"], "name": artist["name"]}}],
+                "aliases": [],
+                "pandora_id": f"AL:{artist_num}:{release_num}",
+                "browse_id": f"MPREbench{artist_num:04d}{release_num:05d}",
+                "audio_playlist_id": f"OLAKbench{artist_num:04d}{release_num:05d}",
+                "tracks": [f"TR:{artist_num}:{release_num}:{track_num}" for track_num in range(tracks_per_release)]
+            } for release_num in range(releases)]
+
+        self.artists_by_id = {artist["id"]: artist for artist in self.artists}
+        self.artists_by_pandora_id = {artist["pandora_id"]: artist for artist in self.artists}
+        self.artists_by_channel_id = {artist["channel_id"]: artist for artist in self.artists}
+        self.release_groups_by_pandora_id = {release_group["pandora_id"]: release_group for release_groups in self.release_groups.values() for release_group in release_groups}
+        self.release_groups_by_browse_id = {release_group["browse_id"]: release_group for release_groups in self.release_groups.values() for release_group in release_groups}
+
+    def all_tracks(self):
+        return [(release_group, track_id) for release_groups in self.release_groups.values() for release_group in release_groups for track_id in release_group["tracks"]]
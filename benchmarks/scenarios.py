@@ -0,0 +1,127 @@
+import contextlib
+import time
+import tracemalloc
+from unittest import mock
+
+from benchmarks.catalog import Catalog
+from benchmarks.servers import FakeMusicBrainz, FakePandora
+from benchmarks.ytmusic import FakeYTMusic
+from playlistmanager.cache import MemoryCache
+from playlistmanager.discography_playlist import discography_playlist
+from playlistmanager.musicbrainz import MusicBrainz
+from playlistmanager.ratelimit import RateLimiter
+from playlistmanager.services import get_service
+from playlistmanager.services.pandora.client import Pandora
+from playlistmanager.similar_artists_playlist import similar_artists_playlist
+
+BENCH_PLAYLIST_ID = "PL:bench"
+
+
+# Starts the fake services over a synthetic catalog, and points the clients at
+# them for the duration of the context.
+class Environment:
+    def __init__(self, *, artists=1, releases=100, latency=0, musicbrainz_rate=None, error_rate=0):
+        self.catalog = Catalog(artists, releases)
+        self.musicbrainz_rate = musicbrainz_rate
+        self.musicbrainz = FakeMusicBrainz(self.catalog, latency=latency, rate_limit=musicbrainz_rate, error_rate=error_rate)
+        self.pandora = FakePandora(self.catalog, latency=latency, error_rate=error_rate)
+        self.ytmusic = FakeYTMusic(self.catalog, latency=latency)
+
+    def __enter__(self):
+        self._stack = contextlib.ExitStack()
+        self._stack.enter_context(self.musicbrainz)
+        self._stack.enter_context(self.pandora)
+        self._stack.enter_context(mock.patch.object(MusicBrainz, "BASE_API", f"{self.musicbrainz.url}{FakeMusicBrainz.BASE_PATH}"))
+        self._stack.enter_context(mock.patch.object(Pandora, "BASE", self.pandora.url))
+        self._stack.enter_context(mock.patch.object(Pandora, "BASE_API", f"{self.pandora.url}/api"))
+
+        # Pooled clients from an earlier run hold sessions with the previous
+        # server.
+        get_service("pandora")._clients.clear()
+        self._stack.callback(get_service("pandora")._clients.clear)
+
+        youtubemusic = get_service("ytm")
+        self._stack.enter_context(mock.patch.object(youtubemusic, "create_client", lambda client_config: self.ytmusic))
+        self._stack.enter_context(mock.patch.object(youtubemusic, "_library_stores", {}))
+        self._stack.enter_context(mock.patch.object(youtubemusic, "_playlist_cache", MemoryCache(youtubemusic.PLAYLIST_CACHE_ENTRIES)))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    # Every run gets a fresh limiter and no cache, so runs don't affect each
+    # other.
+    def musicbrainz_config(self):
+        limiter = RateLimiter(self.musicbrainz_rate) if self.musicbrainz_rate else RateLimiter(float("inf"))
+        return {"use_cache": False, "limiter": limiter}
+
+    def client_config(self, service_name):
+        return {"auth_token": "bench", "use_cache": False} if service_name == "pandora" else {"use_cache": False}
+
+    def request_counts(self):
+        return {
+            "musicbrainz": dict(self.musicbrainz.request_counts),
+            "pandora": dict(self.pandora.request_counts),
+            "ytmusic": dict(self.ytmusic.request_counts)
+        }
+
+
+def _discography(env, service_name):
+    artist = env.catalog.artists[0]
+    discography_playlist(service_name, artist["name"], artist["id"], client_config=env.client_config(service_name), musicbrainz_config=env.musicbrainz_config())
+
+def _similar_artists(env, service_name):
+    source, *similar = env.catalog.artists
+    similar_ids = [artist["id"] for artist in similar] or [source["id"]]
+    similar_artists_playlist(service_name, source["name"], source["id"], similar_ids,
+            client_config=env.client_config(service_name), musicbrainz_config=env.musicbrainz_config(), workers=4)
+
+def _web_ops(env, service_name):
+    release_groups = env.catalog.release_groups[env.catalog.artists[0]["id"]]
+    if service_name == "pandora":
+        env.pandora.add_playlist(BENCH_PLAYLIST_ID, "Bench", [track_id for release_group in release_groups for track_id in release_group["tracks"]])
+    else:
+        env.ytmusic.add_playlist(BENCH_PLAYLIST_ID, "Bench", release_groups)
+
+    service = get_service(service_name)
+    client_config = env.client_config(service_name)
+
+    service.get_playlists_info(client_config)
+    playlist_info = service.get_playlist_info(BENCH_PLAYLIST_ID, client_config)
+    item_ids = [track["item_id"] for track in playlist_info["tracks"]]
+    service.update_playlist(BENCH_PLAYLIST_ID, item_ids[::-1], client_config)
+    service.add_playlist_tracks_to_library(BENCH_PLAYLIST_ID, item_ids[:len(item_ids) // 2], client_config)
+    service.get_playlist_tracks_in_library(BENCH_PLAYLIST_ID, client_config)
+
+SCENARIOS = {
+    "discography": _discography,
+    "similar-artists": _similar_artists,
+    "web-ops": _web_ops
+}
+
+
+def run_scenario(name, service_name, **env_args):
+    with Environment(**env_args) as env:
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            SCENARIOS[name](env, service_name)
+            error = None
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        wall_time = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        request_counts = env.request_counts()
+        return {
+            "scenario": name,
+            "service": service_name,
+            **env_args,
+            "wall_time": wall_time,
+            "peak_memory": peak_memory,
+            "requests": {server: sum(counts.values()) for server, counts in request_counts.items()},
+            "requests_by_endpoint": request_counts,
+            "musicbrainz_rejected": sum(env.musicbrainz.rejected_counts.values()),
+            "error": error
+        }
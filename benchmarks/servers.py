@@ -0,0 +1,309 @@
+import collections
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeServer:
+    # latency is in seconds. rate_limit is the number of requests per second
+    # allowed before responding with 503, and error_rate is the fraction of
+    # requests which randomly fail with 503.
+    def __init__(self, catalog, *, latency=0, rate_limit=None, error_rate=0):
+        self.catalog = catalog
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+
+        self.request_counts = collections.Counter()
+        self.rejected_counts = collections.Counter()
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._last_request = 0
+        self._error_count = 0
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._create_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # Returns True if the request should be rejected.
+    def _throttle(self, endpoint):
+        with self._lock:
+            self.request_counts[endpoint] += 1
+
+            now = time.monotonic()
+            too_fast = self.rate_limit and now - self._last_request < 1 / self.rate_limit
+            if not too_fast:
+                self._last_request = now
+
+            # Deterministic rather than random, so runs are comparable.
+            self._error_count += self.error_rate
+            failed = self._error_count >= 1
+            if failed:
+                self._error_count -= 1
+
+            if too_fast or failed:
+                self.rejected_counts[endpoint] += 1
+                return True
+        return False
+
+    def _create_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers={}):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+                with server._lock:
+                    server.bytes_sent += len(payload)
+
+            def _handle(self, method):
+                parsed = urllib.parse.urlsplit(self.path)
+                endpoint = server.endpoint_name(method, parsed.path)
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._throttle(endpoint):
+                    return self._send_json(503, {"error": "rate limited"}, {"Retry-After": "1"})
+
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                params = dict(urllib.parse.parse_qsl(parsed.query))
+                status, response, headers = server.handle(method, parsed.path, params, body)
+                self._send_json(status, response, headers)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_HEAD(self):
+                endpoint = server.endpoint_name("HEAD", self.path)
+                server._throttle(endpoint)
+                status, _, headers = server.handle("HEAD", self.path, {}, {})
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+        return Handler
+
+    def endpoint_name(self, method, path):
+        return f"{method} {path}"
+
+    def handle(self, method, path, params, body):
+        raise NotImplementedError
+
+
+class FakeMusicBrainz(FakeServer):
+    BASE_PATH = "/ws/2"
+
+    def endpoint_name(self, method, path):
+        parts = path[len(FakeMusicBrainz.BASE_PATH) + 1:].split("/")
+        return f"{parts[0]}/{{id}}" if len(parts) > 1 else parts[0]
+
+    def _artist(self, artist):
+        return {
+            "id": artist["id"],
+            "name": artist["name"],
+            "aliases": [],
+            "relations": [{"type": "youtube", "url": {"resource": f"https://www.youtube.com/channel/{artist['channel_id']}"}}]
+        }
+
+    @staticmethod
+    def _release_group(release_group):
+        return {key: value for key, value in release_group.items() if key in ("id", "title", "primary-type", "secondary-types", "first-release-date", "artist-credit", "aliases")}
+
+    def _page(self, release_groups, params, count_key):
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 25))
+        page = [self._release_group(release_group) for release_group in release_groups[offset:offset + limit]]
+        return {"release-groups": page, count_key: len(release_groups)}
+
+    def handle(self, method, path, params, body):
+        parts = path[len(FakeMusicBrainz.BASE_PATH) + 1:].split("/")
+        if parts[0] == "artist" and len(parts) == 1:
+            query = params.get("query", "").replace("+", " ").lower()
+            artists = [{"id": artist["id"], "name": artist["name"], "score": 100} for artist in self.catalog.artists if query in artist["name"].lower()]
+            return 200, {"artists": artists}, {}
+
+        if parts[0] == "artist":
+            artist = self.catalog.artists_by_id.get(parts[1])
+            return (200, self._artist(artist), {}) if artist else (404, {"error": "Not Found"}, {})
+
+        if parts[0] == "release-group" and "query" in params:
+            query = params["query"]
+            artist_id = re.search(r"arid:(\S+)", query).group(1)
+            primary_types = set(re.findall(r"primarytype:(\w+)", query))
+            excluded = set(re.findall(r"NOT secondarytype:\"(\w+)\"", query))
+            release_groups = [release_group for release_group in self.catalog.release_groups.get(artist_id, [])
+                              if release_group["primary-type"].lower() in primary_types
+                              and not excluded.intersection(value.lower() for value in release_group["secondary-types"])]
+            return 200, self._page(release_groups, params, "count"), {}
+
+        if parts[0] == "release-group":
+            types = set(params.get("type", "album").split("|"))
+            release_groups = [release_group for release_group in self.catalog.release_groups.get(params.get("artist"), [])
+                              if release_group["primary-type"].lower() in types]
+            return 200, self._page(release_groups, params, "release-group-count"), {}
+
+        return 404, {"error": "Not Found"}, {}
+
+
+class FakePandora(FakeServer):
+    # Appending more tracks than this in one request fails, like the real one.
+    APPEND_TRACK_LIMIT = 700
+    # Listing a playlist returns at most this many tracks per page, however
+    # many are asked for.
+    TRACKS_PAGE_LIMIT = 500
+
+    def __init__(self, catalog, **kwargs):
+        super().__init__(catalog, **kwargs)
+        self.playlists = {}
+        self.library = {}
+
+    def endpoint_name(self, method, path):
+        return path[len("/api/"):] if path.startswith("/api/") else f"{method} {path}"
+
+    def add_playlist(self, pandora_id, name, track_ids):
+        self.playlists[pandora_id] = {"pandoraId": pandora_id, "name": name, "version": 1, "tracks": list(track_ids)}
+        return self.playlists[pandora_id]
+
+    def _track_annotation(self, track_id):
+        _, artist_num, release_num, _ = track_id.split(":")
+        release_group = self.catalog.release_groups_by_pandora_id[f"AL:{artist_num}:{release_num}"]
+        return {
+            "pandoraId": track_id,
+            "type": "TR",
+            "name": track_id,
+            "artistName": release_group["artist-credit"][0]["name"],
+            "albumName": release_group["title"],
+            "albumId": release_group["pandora_id"],
+            "duration": 180
+        }
+
+    @staticmethod
+    def _album_annotation(release_group):
+        return {
+            "pandoraId": release_group["pandora_id"],
+            "type": "AL",
+            "name": release_group["title"],
+            "artistName": release_group["artist-credit"][0]["name"],
+            "trackCount": len(release_group["tracks"])
+        }
+
+    def _playlist_info(self, playlist):
+        return {
+            "pandoraId": playlist["pandoraId"],
+            "name": playlist["name"],
+            "version": playlist["version"],
+            "totalTracks": len(playlist["tracks"]),
+            "duration": 180 * len(playlist["tracks"])
+        }
+
+    def handle(self, method, path, params, body):
+        if method == "HEAD":
+            return 200, None, {"Set-Cookie": "csrftoken=bench; Path=/"}
+
+        endpoint = self.endpoint_name(method, path)
+        request = body.get("request", body)
+
+        if endpoint == "v3/sod/search":
+            query = request["query"].lower()
+            if "AL" in request["types"]:
+                matches = [self._album_annotation(release_group) for release_group in self.catalog.release_groups_by_pandora_id.values() if release_group["title"].lower() in query]
+            else:
+                matches = [{"pandoraId": artist["pandora_id"], "type": "AR", "name": artist["name"]} for artist in self.catalog.artists if query in artist["name"].lower()]
+            matches = matches[:request.get("count", 20)]
+            return 200, {"results": [match["pandoraId"] for match in matches], "annotations": {match["pandoraId"]: match for match in matches}}, {}
+
+        if endpoint == "v4/catalog/getArtistDiscographyWithCollaborations":
+            artist = self.catalog.artists_by_pandora_id[request["artistPandoraId"]]
+            release_groups = self.catalog.release_groups[artist["id"]]
+            annotated = release_groups[:request.get("annotationLimit", 0)]
+            return 200, {
+                "discography": [release_group["pandora_id"] for release_group in release_groups],
+                "annotations": {release_group["pandora_id"]: self._album_annotation(release_group) for release_group in annotated}
+            }, {}
+
+        if endpoint == "v4/catalog/getDetails":
+            release_group = self.catalog.release_groups_by_pandora_id[request["pandoraId"]]
+            return 200, {"annotations": {track_id: self._track_annotation(track_id) for track_id in release_group["tracks"]}}, {}
+
+        if endpoint == "v4/playlists/create":
+            playlist = self.add_playlist(f"PL:{len(self.playlists)}", request["details"]["name"], [])
+            return 200, self._playlist_info(playlist), {}
+
+        if endpoint == "v4/playlists/appendItems":
+            playlist = self.playlists[request["pandoraId"]]
+            track_ids = [track_id for album_id in request["itemPandoraIds"] for track_id in self.catalog.release_groups_by_pandora_id[album_id]["tracks"]]
+            if len(track_ids) > FakePandora.APPEND_TRACK_LIMIT:
+                return 400, {"errorCode": 1000}, {}
+            playlist["tracks"].extend(track_ids)
+            playlist["version"] += 1
+            return 200, self._playlist_info(playlist), {}
+
+        if endpoint == "v6/collections/getSortedPlaylists":
+            playlists = sorted(self.playlists.values(), key=lambda playlist: playlist["name"])
+            offset, limit = request.get("offset", 0), request.get("limit", 100)
+            page = playlists[offset:offset + limit]
+            return 200, {
+                "items": [{"pandoraId": playlist["pandoraId"], "name": playlist["name"]} for playlist in page],
+                "annotations": {playlist["pandoraId"]: self._playlist_info(playlist) for playlist in page[:request.get("annotationLimit", 0)]}
+            }, {}
+
+        if endpoint == "v7/playlists/getTracks":
+            playlist = self.playlists[request["pandoraId"]]
+            offset, limit = request.get("offset", 0), min(request.get("limit", 100), FakePandora.TRACKS_PAGE_LIMIT)
+            page = playlist["tracks"][offset:offset + limit]
+            return 200, {
+                **self._playlist_info(playlist),
+                "tracks": [{"itemId": offset + index, "trackPandoraId": track_id} for index, track_id in enumerate(page)],
+                "annotations": {track_id: self._track_annotation(track_id) for track_id in page}
+            }, {}
+
+        if endpoint in ("v7/playlists/editTracks", "v7/playlists/deleteTracks"):
+            playlist = self.playlists[request["pandoraId"]]
+            playlist["version"] += 1
+            return 200, self._playlist_info(playlist), {}
+
+        if endpoint == "v6/collections/addItem":
+            self.library[request["pandoraId"]] = {"pandoraId": request["pandoraId"], "pandoraType": request["pandoraId"][:2]}
+            return 200, {}, {}
+
+        if endpoint == "v6/collections/getItems":
+            items = list(self.library.values())
+            start = int(request.get("cursor") or 0)
+            page = items[start:start + request.get("limit", 10000)]
+            cursor = str(start + len(page)) if start + len(page) < len(items) else None
+            return 200, {"items": page, "cursor": cursor}, {}
+
+        if endpoint == "v1/graphql/graphql":
+            similar = [{"pandoraId": artist["pandora_id"], "type": "AR", "name": artist["name"], "sortableName": artist["name"]} for artist in self.catalog.artists]
+            return 200, {"data": {"entity": {"similarArtists": similar}}}, {}
+
+        return 404, {"error": "Not Found"}, {}
@@ -0,0 +1,55 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Each case runs in a fresh interpreter, so nothing is already imported.
+# "eager" imports every service package up front, as the registry used to,
+# for comparison.
+CASES = {
+    "parser": "from playlistmanager import cli; cli._create_parser()",
+    "pandora": "from playlistmanager import cli; cli._create_parser(); from playlistmanager.services import get_service; get_service('pandora')",
+    "ytm": "from playlistmanager import cli; cli._create_parser(); from playlistmanager.services import get_service; get_service('ytm')",
+    "eager": "from playlistmanager import cli; cli._create_parser(); import playlistmanager.services.pandora, playlistmanager.services.youtubemusic"
+}
+HEAVY_MODULES = ("requests", "ytmusicapi", "bs4", "unidecode")
+
+_TIMER = """
+import sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+import json
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def time_case(code, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", _TIMER.format(code=code, heavy=HEAVY_MODULES)], capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output))
+    return {"seconds": statistics.median(result["seconds"] for result in results), "loaded": results[0]["loaded"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description="Time the imports a CLI run needs before doing any work.")
+    parser.add_argument("--case", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--runs", type=int, default=10, help="The median is reported. Default: %(default)s.")
+    parser.add_argument("--json", action="store_true", help="Print each result as a line of JSON.")
+    args = parser.parse_args()
+
+    if not args.json:
+        print(f"{'case':<8} {'import (ms)':>11}  heavy modules loaded")
+
+    for case in args.case:
+        result = time_case(CASES[case], args.runs)
+        if args.json:
+            print(json.dumps({"case": case, **result}), flush=True)
+        else:
+            print(f"{case:<8} {result['seconds'] * 1000:>11.1f}  {', '.join(result['loaded']) or '-'}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
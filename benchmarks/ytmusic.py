@@ -0,0 +1,100 @@
+import collections
+import threading
+import time
+
+# ytmusicapi talks to a fixed host with deeply nested, undocumented response
+# formats, so rather than serve those over HTTP, this stands in for the YTMusic
+# client itself. Each call sleeps for the configured latency and is counted
+# under the ytmusicapi method name, so results are comparable with the HTTP
+# fakes.
+class FakeYTMusic:
+    def __init__(self, catalog, *, latency=0):
+        self.catalog = catalog
+        self.latency = latency
+        self.request_counts = collections.Counter()
+        self.playlists = {}
+        self.library = set()
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.request_counts[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _check_auth(self):
+        pass
+
+    def add_playlist(self, playlist_id, title, release_groups):
+        tracks = [{
+            "videoId": track_id,
+            "setVideoId": f"{playlist_id}:{index}",
+            "title": track_id,
+            "artists": [{"name": release_group["artist-credit"][0]["name"]}],
+            "album": {"name": release_group["title"]},
+            "duration": "3:00",
+            "isAvailable": True,
+            "feedbackTokens": {"add": f"add:{track_id}"}
+        } for index, (release_group, track_id) in enumerate((release_group, track_id) for release_group in release_groups for track_id in release_group["tracks"])]
+        self.playlists[playlist_id] = {"id": playlist_id, "title": title, "trackCount": len(tracks), "tracks": tracks}
+        return self.playlists[playlist_id]
+
+    def search(self, query, filter=None, limit=20, ignore_spelling=False):
+        self._call("search")
+        return [{"browseId": artist["channel_id"], "artist": artist["name"]} for artist in self.catalog.artists if query.lower() in artist["name"].lower()][:limit]
+
+    def get_artist(self, channel_id):
+        self._call("get_artist")
+        artist = self.catalog.artists_by_channel_id[channel_id]
+        albums = [{"title": release_group["title"], "browseId": release_group["browse_id"]} for release_group in self.catalog.release_groups[artist["id"]]]
+        related = [{"browseId": other["channel_id"], "title": other["name"]} for other in self.catalog.artists if other is not artist]
+        return {"name": artist["name"], "albums": {"browseId": f"albums:{channel_id}", "params": "", "results": albums[:10]}, "related": {"results": related}}
+
+    def get_artist_albums(self, browse_id, params):
+        self._call("get_artist_albums")
+        artist = self.catalog.artists_by_channel_id[browse_id.split(":", 1)[1]]
+        return [{"title": release_group["title"], "browseId": release_group["browse_id"]} for release_group in self.catalog.release_groups[artist["id"]]]
+
+    def get_album(self, browse_id):
+        self._call("get_album")
+        return {"audioPlaylistId": self.catalog.release_groups_by_browse_id[browse_id]["audio_playlist_id"]}
+
+    def create_playlist(self, title, description):
+        self._call("create_playlist")
+        playlist_id = f"PLbench{len(self.playlists)}"
+        self.add_playlist(playlist_id, title, [])
+        return playlist_id
+
+    def add_playlist_items(self, playlist_id, videoIds=None, source_playlist=None):
+        self._call("add_playlist_items")
+        return {"status": "STATUS_SUCCEEDED"}
+
+    def _send_request(self, endpoint, body, *args):
+        self._call(f"_send_request:{endpoint}")
+        return {"status": "STATUS_SUCCEEDED"}
+
+    def get_playlist(self, playlist_id, limit=100):
+        self._call("get_playlist")
+        playlist = self.playlists[playlist_id]
+        return {**playlist, "tracks": list(playlist["tracks"][:limit])}
+
+    def edit_playlist(self, playlist_id, moveItem=None, **kwargs):
+        self._call("edit_playlist")
+        return "STATUS_SUCCEEDED"
+
+    def remove_playlist_items(self, playlist_id, videos):
+        self._call("remove_playlist_items")
+        return "STATUS_SUCCEEDED"
+
+    def get_library_songs(self, limit=25, *args, **kwargs):
+        self._call("get_library_songs")
+        return [{"videoId": video_id} for video_id in list(self.library)[:limit]]
+
+    def edit_song_library_status(self, feedbackTokens=None):
+        self._call("edit_song_library_status")
+        self.library.update(token.split(":", 1)[1] for token in feedbackTokens or [])
+        return {}
+
+    def get_library_playlists(self, limit=25):
+        self._call("get_library_playlists")
+        return [{"playlistId": playlist_id, "title": playlist["title"], "count": playlist["trackCount"]} for playlist_id, playlist in self.playlists.items()][:limit]
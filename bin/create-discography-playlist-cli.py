@@ -5,5 +5,9 @@ from playlistmanager.discography_playlist import discography_playlist_cli
 if __name__ == "__main__":
     args = cli.parse_args()
 
-    discography_playlist_cli(
-        args["service"], args["artist"], args["match_threshhold"], args["filter"], args["sorter"], args["auth"])
+    try:
+        discography_playlist_cli(
+            args["service"], args["artist"], args["match_threshhold"], args["filter"], args["sorter"], args["auth"],
+            args["musicbrainz_config"], args["client_options"])
+    finally:
+        cli.write_metrics(args)
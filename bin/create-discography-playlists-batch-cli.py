@@ -0,0 +1,27 @@
+import contextlib
+import json
+import sys
+
+from playlistmanager import cli
+from playlistmanager.batch import discography_playlists_batch, read_artists
+
+
+if __name__ == "__main__":
+    args = cli.parse_batch_args()
+
+    try:
+        input_file = sys.stdin if args["input"] == "-" else open(args["input"])
+        with input_file:
+            artists = read_artists(input_file)
+
+        # The services print progress to stdout, which would garble the
+        # results, so it's sent to stderr while the batch runs.
+        output_file = sys.stdout if args["output"] == "-" else open(args["output"], "w")
+        with output_file, contextlib.redirect_stdout(sys.stderr):
+            results = discography_playlists_batch(
+                args["service"], artists, args["match_threshhold"], args["filter"], args["sorter"], args["auth"],
+                args["musicbrainz_config"], args["workers"], args["client_options"])
+            for result in results:
+                print(json.dumps(result), file=output_file, flush=True)
+    finally:
+        cli.write_metrics(args)
@@ -5,5 +5,9 @@ from playlistmanager.similar_artists_playlist import similar_artists_playlist_cl
 if __name__ == "__main__":
     args = cli.parse_args()
 
-    similar_artists_playlist_cli(
-        args["service"], args["artist"], args["match_threshhold"], args["filter"], args["sorter"], args["auth"])
+    try:
+        similar_artists_playlist_cli(
+            args["service"], args["artist"], args["match_threshhold"], args["filter"], args["sorter"], args["auth"],
+            args["musicbrainz_config"], args["workers"], args["client_options"])
+    finally:
+        cli.write_metrics(args)
@@ -0,0 +1,18 @@
+import argparse
+
+from playlistmanager.musicbrainz_offline import import_dumps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an offline MusicBrainz database from the JSON data dumps.")
+    parser.add_argument("db", help="The database to create or update.")
+    parser.add_argument("--artist", help="The artist dump, either artist.tar.xz or the extracted mbdump/artist file.")
+    parser.add_argument("--release-group", help="The release group dump, either release-group.tar.xz or the extracted mbdump/release-group file.")
+    args = parser.parse_args()
+
+    if not args.artist and not args.release_group:
+        parser.error("Provide at least one of --artist or --release-group.")
+
+    counts = import_dumps(args.db, artist_dump=args.artist, release_group_dump=args.release_group)
+    for entity, count in counts.items():
+        print(f"Imported {count} {entity} entries.")
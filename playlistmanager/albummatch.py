@@ -0,0 +1,132 @@
+import collections
+import re
+
+from unidecode import unidecode
+
+# Trailing qualifiers which mark a different edition of the same album, such as
+# "(Deluxe)", "[2011 Remaster]" or " - Expanded Edition". They differ between
+# services far more often than the album itself does.
+_EDITION_WORDS = r"deluxe|edition|remaster(?:ed)?|expanded|anniversary|bonus|version|reissue|special|collector'?s|mono|stereo"
+_EDITION_SUFFIX_RE = re.compile(
+    rf"\s*(?:[\(\[][^\(\)\[\]]*\b(?:{_EDITION_WORDS})\b[^\(\)\[\]]*[\)\]]|-\s+[^-]*\b(?:{_EDITION_WORDS})\b[^-]*)\s*$",
+    re.IGNORECASE)
+_NON_WORD_RE = re.compile(r"[\W_]+")
+# Roman numerals up to 39. Any higher and they start to look like words.
+_ROMAN_NUMERAL_RE = re.compile(r"^x{0,3}(ix|iv|v?i{0,3})$")
+_ROMAN_VALUES = {"i": 1, "v": 5, "x": 10}
+
+DEFAULT_THRESHOLD = 0.75
+
+
+def normalize_title(title):
+    title = unidecode(title)
+    while True:
+        stripped = _EDITION_SUFFIX_RE.sub("", title)
+        # Don't strip a title down to nothing, e.g. an album called "Deluxe".
+        if stripped == title or not stripped.strip():
+            break
+        title = stripped
+
+    title = title.casefold().replace("&", " and ").replace("'", "")
+    return _NON_WORD_RE.sub(" ", title).strip()
+
+def _roman_to_int(numeral):
+    values = [_ROMAN_VALUES[char] for char in numeral]
+    return sum(-value if value < next_value else value for value, next_value in zip(values, values[1:] + [0]))
+
+# The numbers in a title, such as "II", "2" or the "3" of "Vol. 3". Titles
+# which differ only in these are sequels or other volumes, not the same album.
+def _number(word):
+    if word.isdigit():
+        return int(word)
+    if _ROMAN_NUMERAL_RE.match(word):
+        return _roman_to_int(word)
+    return None
+
+def _numbers(normalized):
+    return collections.Counter(number for word in normalized.split() if (number := _number(word)) is not None)
+
+# Word unigrams and bigrams, so word order counts for something. Numbers are
+# written out in digits, so "II" and "2" are the same word.
+def _grams(normalized):
+    words = [str(number) if (number := _number(word)) is not None else word for word in normalized.split()]
+    return set(words) | {f"{first} {second}" for first, second in zip(words, words[1:])}
+
+# Averages how similar the two titles are overall with how much of the query
+# appears in the candidate, so "Abbey Road" still scores well against
+# "Abbey Road Super Deluxe Box".
+def _score(query_grams, candidate_grams):
+    if not query_grams or not candidate_grams:
+        return 0
+    overlap = len(query_grams & candidate_grams)
+    dice = 2 * overlap / (len(query_grams) + len(candidate_grams))
+    containment = overlap / len(query_grams)
+    return (dice + containment) / 2
+
+
+# An index over one discography's album titles. Built once, then queried for
+# each album being matched. Candidates are only drawn from titles sharing at
+# least one word with the query, so a lookup doesn't scan the whole
+# discography.
+class TitleIndex:
+    def __init__(self, entries=()):
+        self._entries = {}
+        self._added = 0
+        self._exact = collections.defaultdict(list)
+        self._postings = collections.defaultdict(set)
+        for title, value in entries:
+            self.add(title, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, value):
+        return value in self._entries
+
+    def add(self, title, value):
+        normalized = normalize_title(title)
+        grams = _grams(normalized)
+        self._entries[value] = (normalized, grams, self._added, _numbers(normalized))
+        self._added += 1
+        self._exact[normalized].append(value)
+        for gram in grams:
+            self._postings[gram].add(value)
+
+    # Remove an entry, such as once it's been matched, so it can't be matched
+    # again.
+    def discard(self, value):
+        entry = self._entries.pop(value, None)
+        if not entry:
+            return
+
+        normalized, grams, _, _ = entry
+        self._exact[normalized].remove(value)
+        for gram in grams:
+            self._postings[gram].discard(value)
+
+    # Find the value whose title best matches any of the given titles, which
+    # are typically an album's title followed by its aliases. An exact match on
+    # any of them wins outright; ties otherwise go to the earliest title, then
+    # the earliest added entry. A fuzzy match must have the same numbers in its
+    # title, so "Led Zeppelin" never matches "Led Zeppelin II". Returns
+    # (value, score), or (None, 0) if nothing scores at least threshold.
+    def best_match(self, titles, threshold=DEFAULT_THRESHOLD):
+        queries = [normalize_title(title) for title in titles]
+        for normalized in queries:
+            if self._exact.get(normalized):
+                return self._exact[normalized][0], 1.0
+
+        best_value, best_score = None, 0
+        for normalized in queries:
+            query_grams = _grams(normalized)
+            query_numbers = _numbers(normalized)
+            candidates = set().union(*(self._postings.get(gram, ()) for gram in query_grams))
+            for value in sorted(candidates, key=lambda value: self._entries[value][2]):
+                _, grams, _, numbers = self._entries[value]
+                if numbers != query_numbers:
+                    continue
+                score = _score(query_grams, grams)
+                if score > best_score:
+                    best_value, best_score = value, score
+
+        return (best_value, best_score) if best_score >= threshold else (None, 0)
@@ -0,0 +1,67 @@
+import concurrent.futures
+import re
+
+from playlistmanager import __version__
+from playlistmanager.musicbrainz import AlbumSorter, Filter, MusicBrainz
+from playlistmanager.services import get_service
+
+USER_AGENT = f"PlaylistManager/{__version__}"
+
+MBID_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE)
+
+
+# One artist name or MusicBrainz ID per line. Blank lines and lines starting
+# with "#" are skipped, as are repeats.
+def read_artists(lines):
+    artists = (line.strip() for line in lines)
+    return list(dict.fromkeys(artist for artist in artists if artist and not artist.startswith("#")))
+
+# There's nobody to ask when a name is ambiguous, so take the best match.
+def _resolve_artist(musicbrainz, artist, match_threshhold):
+    if MBID_RE.match(artist):
+        return musicbrainz.get_artist_info(artist.lower())
+
+    search_result = musicbrainz.search_artist(artist, match_threshhold)
+    if not search_result:
+        raise ValueError(f"No MusicBrainz artist matching \"{artist}\" with a score of at least {match_threshhold}.")
+    return musicbrainz.get_artist_info(search_result[0]["id"])
+
+def _discography_playlist_job(musicbrainz, service, client, client_config, artist, match_threshhold, release_filter, album_sorter, resolved):
+    result = {"artist": artist}
+    try:
+        artist_info = _resolve_artist(musicbrainz, artist, match_threshhold)
+        result.update({"musicbrainz_id": artist_info["id"], "name": artist_info["name"]})
+
+        # Different lines can name the same artist, e.g. by name and by ID.
+        duplicate_of = resolved.setdefault(artist_info["id"], artist)
+        if duplicate_of != artist:
+            return {**result, "status": "skipped", "duplicate_of": duplicate_of}
+
+        albums_info = musicbrainz.iter_artist_albums_info(artist_info["id"], release_filter, album_sorter)
+        playlist_name = service.create_discography_playlist(albums_info, artist_info["links"], artist_info["name"], client_config, client=client)
+        return {**result, "status": "created", "playlist": playlist_name}
+    except Exception as exc:
+        return {**result, "status": "failed", "error": str(exc)}
+
+# Build a discography playlist for each artist, running up to workers of them
+# at once. The jobs share a single MusicBrainz client, and so its cache, rate
+# limiter and in-flight requests, and a single service client.
+#
+# Yields a dict per artist, in the order given, containing:
+# - artist - the name or ID as given
+# - status - one of "created", "skipped" or "failed"
+# - musicbrainz_id, name - the MusicBrainz artist, if it was found
+# - playlist - the name of the playlist, if it was created
+# - duplicate_of - the line naming the same artist which was built instead, if skipped
+# - error - what went wrong, if it failed
+def discography_playlists_batch(service_name, artists, match_threshhold, release_filter=Filter.create(), album_sorter=AlbumSorter.create(), auth=None, musicbrainz_config={}, workers=1, client_options={}):
+    service = get_service(service_name)
+    client_config = {**service.auth_to_config(auth), **client_options}
+    client = service.create_client(client_config)
+    musicbrainz = MusicBrainz.connect(USER_AGENT, **musicbrainz_config)
+
+    resolved = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [executor.submit(_discography_playlist_job, musicbrainz, service, client, client_config, artist, match_threshhold, release_filter, album_sorter, resolved) for artist in artists]
+        for future in futures:
+            yield future.result()
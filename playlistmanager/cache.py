@@ -0,0 +1,175 @@
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "playlistmanager")
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024  # Bytes
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def cache_key(endpoint, params):
+    # Drop unset params and order the rest so equivalent requests share a key,
+    # regardless of how the caller built the params dict.
+    normalized = {key: str(value) for key, value in params.items() if value is not None and value != ""}
+    return f"{endpoint}?{json.dumps(normalized, sort_keys=True)}"
+
+
+class Cache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class NullCache(Cache):
+    pass
+
+
+# Holds at most max_entries, dropping the least recently used. Expired entries
+# are dropped whenever a new one is set, so they don't linger until read.
+class MemoryCache(Cache):
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__()
+        self.max_entries = max_entries
+        # key -> (value, expires), least recently used first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (value, now + ttl)
+            self._entries.move_to_end(key)
+            self._evict(now)
+
+    def _evict(self, now):
+        for key in [key for key, (_, expires) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {**super().stats(), "entries": len(self._entries)}
+
+
+class SqliteCache(Cache):
+    FILENAME = "cache.sqlite3"
+
+    @staticmethod
+    def open(cache_dir=DEFAULT_CACHE_DIR, filename=FILENAME, max_size=DEFAULT_MAX_SIZE):
+        os.makedirs(cache_dir, exist_ok=True)
+        return SqliteCache(os.path.join(cache_dir, filename), max_size)
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        super().__init__()
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+        # The connection is shared between threads, so access is serialized
+        # with the lock instead of relying on sqlite's own checks.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            expires REAL NOT NULL,
+            accessed REAL NOT NULL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM entries WHERE key = ?", (key, )).fetchone()
+            if not row or row[1] <= now:
+                if row:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key, ))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        serialized = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, serialized, len(serialized), now + ttl, now))
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key, ))
+            self._conn.commit()
+
+    # Drop expired entries, then the least recently used ones until the cache
+    # fits within max_size again.
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM entries WHERE expires <= ?", (now, ))
+
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        to_delete = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if total_size <= self.max_size:
+                break
+            to_delete.append((key, ))
+            total_size -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", to_delete)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {**super().stats(), "entries": entries, "size": size}
+
+
+def open_cache(cache_dir=DEFAULT_CACHE_DIR, use_cache=True, filename=SqliteCache.FILENAME):
+    if not use_cache:
+        return NullCache()
+    return SqliteCache.open(cache_dir or DEFAULT_CACHE_DIR, filename)
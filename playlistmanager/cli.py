@@ -1,15 +1,17 @@
 import argparse
 import itertools
+import sys
 
+from playlistmanager.cache import DEFAULT_CACHE_DIR
+from playlistmanager.metrics import metrics
 from playlistmanager.musicbrainz import AlbumSorter, Filter
 from playlistmanager.services import supported_services_info
 
-def parse_args():
+def _create_parser():
     supported_service_names = list(itertools.chain.from_iterable([info["names"] for info in supported_services_info()]))
 
     parser = argparse.ArgumentParser()
     parser.add_argument("service", choices=supported_service_names)
-    parser.add_argument("artist", help="Create a playlist of this artist's releases.")
     parser.add_argument("--auth")
 
     parser.add_argument("--match-threshhold", type=int, choices=range(1, 101), metavar="{1..100}", default=85,
@@ -18,6 +20,21 @@ def parse_args():
     parser.add_argument("--sort-field", default="release")
     parser.add_argument("--sort-order", default=AlbumSorter.SORT_ORDER_ASC)
     parser.add_argument("--no-sort", action="store_false", dest="sort")
+    parser.add_argument("--sort-buffer", type=int,
+            help="Start building the playlist once this many albums are buffered, instead of waiting for all of them. "
+                 "Albums released further out of order than this may be misplaced.")
+    parser.add_argument("--workers", type=int, default=4,
+            help="Number of artists to look up concurrently, where applicable. Default: %(default)s.")
+
+    cache_group = parser.add_argument_group("Cache", "Control the on-disk caches of MusicBrainz and service responses.")
+    cache_group.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Default: %(default)s.")
+    cache_group.add_argument("--no-cache", action="store_false", dest="use_cache")
+    cache_group.add_argument("--offline-db",
+            help="Serve MusicBrainz data from a database built by import-musicbrainz-dump-cli.py, falling back to the web service for anything it lacks.")
+
+    metrics_group = parser.add_argument_group("Metrics", "Report per-endpoint request statistics at the end of the run.")
+    metrics_group.add_argument("--metrics", choices=["json", "prometheus"])
+    metrics_group.add_argument("--metrics-file", default="-", help="Writes to stderr by default.")
 
     filter_group = parser.add_argument_group("Filters", "Customize types of releases to be included.")
     filter_group.add_argument("--include-compilations", action="store_true")
@@ -27,10 +44,42 @@ def parse_args():
     filter_group.add_argument("--include-eps", action="store_true")
     filter_group.add_argument("--include-singles", action="store_true")
     filter_group.add_argument("--include-all", action="store_true")
+    filter_group.add_argument("--no-server-filter", action="store_false", dest="server_filter",
+            help="Download every release and filter locally, rather than asking MusicBrainz to exclude them.")
 
-    args = vars(parser.parse_args())
+    return parser
 
+def _process_args(args):
     album_filter = Filter.create(**args)
     album_sorter = AlbumSorter.create(**args) if args["sort"] else AlbumSorter.create(sort_field=None)
 
-    return {**args, "filter": album_filter, "sorter": album_sorter}
+    musicbrainz_config = {"cache_dir": args["cache_dir"], "use_cache": args["use_cache"], "offline_db": args["offline_db"]}
+    # Merged into the service's client_config, alongside its auth.
+    client_options = {"cache_dir": args["cache_dir"], "use_cache": args["use_cache"]}
+
+    return {**args, "filter": album_filter, "sorter": album_sorter, "musicbrainz_config": musicbrainz_config, "client_options": client_options}
+
+def parse_args():
+    parser = _create_parser()
+    parser.add_argument("artist", help="Create a playlist of this artist's releases.")
+    return _process_args(vars(parser.parse_args()))
+
+def parse_batch_args():
+    parser = _create_parser()
+    parser.add_argument("input", nargs="?", default="-",
+            help="File listing one artist name or MusicBrainz ID per line. Reads from stdin by default.")
+    parser.add_argument("--output", default="-",
+            help="Write a JSON result per artist to this file, one per line. Writes to stdout by default. "
+                 "Progress messages go to stderr.")
+    return _process_args(vars(parser.parse_args()))
+
+def write_metrics(args):
+    if not args.get("metrics"):
+        return
+
+    report = metrics.to_json() + "\n" if args["metrics"] == "json" else metrics.to_prometheus()
+    if args["metrics_file"] == "-":
+        sys.stderr.write(report)
+    else:
+        with open(args["metrics_file"], "w") as file:
+            file.write(report)
@@ -0,0 +1,81 @@
+import collections
+import hashlib
+import json
+import threading
+import time
+
+DEFAULT_MAX_SIZE = 32
+# Long enough to cover a user clicking around the web app, short enough that
+# abandoned sessions don't linger.
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+
+
+def config_key(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Ready-made clients, keyed by the config they were created from, so repeated
+# operations for the same user reuse a client's connections and tokens rather
+# than setting up new ones. A client is shared by everyone asking for the same
+# config, so it needs to be safe to use from several threads.
+#
+# The least recently used client is dropped once there are more than max_size,
+# as is any client left unused for idle_timeout seconds. health_check, if
+# given, is called with a client before it's handed out again, and a client
+# it rejects is replaced.
+class ClientPool:
+    def __init__(self, factory, *, max_size=DEFAULT_MAX_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT, health_check=None):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+        # key -> [client, last used]
+        self._clients = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_idle(self, now):
+        while self._clients:
+            key, (_, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._clients[key]
+
+    def _take(self, key):
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry:
+                entry[1] = now
+                self._clients.move_to_end(key)
+                return entry[0]
+            return None
+
+    def get(self, config):
+        key = config_key(config)
+
+        client = self._take(key)
+        if client is not None and (not self.health_check or self.health_check(client)):
+            return client
+
+        # Created outside the lock, since it usually means network requests. If
+        # two threads race to create the same client, the last one is kept.
+        client = self.factory(config)
+        with self._lock:
+            self._clients[key] = [client, time.monotonic()]
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+        return client
+
+    def discard(self, config):
+        with self._lock:
+            self._clients.pop(config_key(config), None)
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
@@ -27,20 +27,22 @@ def _prompt_for_artist(matches, search_name):
 
         print("Invalid choice.")
 
-def discography_playlist(service_name, search_name, artist_id, release_filter=Filter.create(), album_sorter=AlbumSorter.create(), client_config={}):
-    musicbrainz = MusicBrainz.connect(USER_AGENT)
+def discography_playlist(service_name, search_name, artist_id, release_filter=Filter.create(), album_sorter=AlbumSorter.create(), client_config={}, musicbrainz_config={}):
+    musicbrainz = MusicBrainz.connect(USER_AGENT, **musicbrainz_config)
 
-    artist_links = musicbrainz.get_artist_links(artist_id)
-    albums_info = musicbrainz.get_artist_albums_info(artist_id, release_filter, album_sorter)
+    artist_links = musicbrainz.get_artist_info(artist_id)["links"]
+    # Stream the albums so the service can start matching them while the rest
+    # are still being fetched from MusicBrainz.
+    albums_info = musicbrainz.iter_artist_albums_info(artist_id, release_filter, album_sorter)
 
     return get_service(service_name).create_discography_playlist(albums_info, artist_links, search_name, client_config)
 
-def discography_playlist_cli(service_name, search_name, match_threshhold, release_filter=Filter.create(), album_sorter=AlbumSorter.create(), auth=None):
-    musicbrainz = MusicBrainz.connect(USER_AGENT)
+def discography_playlist_cli(service_name, search_name, match_threshhold, release_filter=Filter.create(), album_sorter=AlbumSorter.create(), auth=None, musicbrainz_config={}, client_options={}):
+    musicbrainz = MusicBrainz.connect(USER_AGENT, **musicbrainz_config)
 
     search_result = musicbrainz.search_artist(search_name, match_threshhold)
     artist = _prompt_for_artist(search_result, search_name) if len(search_result) > 1 else search_result[0]
 
-    client_config = get_service(service_name).auth_to_config(auth)
+    client_config = {**get_service(service_name).auth_to_config(auth), **client_options}
 
-    return discography_playlist(service_name, search_name, artist["id"], release_filter, album_sorter, client_config)
+    return discography_playlist(service_name, search_name, artist["id"], release_filter, album_sorter, client_config, musicbrainz_config)
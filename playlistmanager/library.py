@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import threading
+import time
+
+from playlistmanager.cache import DEFAULT_CACHE_DIR
+
+FILENAME = "library.sqlite3"
+# A snapshot is only ever extended with newly added items, so items removed
+# from the library are picked up by periodically downloading it in full.
+DEFAULT_MAX_AGE = 60 * 60
+
+
+# The IDs of the items in a user's library, kept between runs so only what was
+# added since the last sync needs to be downloaded. How the snapshot is synced
+# is up to each service; the cursor is whatever that service needs to resume.
+class LibrarySnapshot:
+    def __init__(self, store, owner, ids, cursor, synced):
+        self.owner = owner
+        self.cursor = cursor
+        # When the snapshot was last downloaded in full.
+        self.synced = synced
+        # Held while syncing, so concurrent requests don't sync twice.
+        self.lock = threading.Lock()
+        self._store = store
+        self._ids = set(ids)
+
+    def __contains__(self, id):
+        return id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def expired(self, max_age=DEFAULT_MAX_AGE):
+        return self.synced is None or time.time() - self.synced > max_age
+
+    def replace(self, ids, cursor=None):
+        self._ids = set(ids)
+        self.cursor = cursor
+        self.synced = time.time()
+        self._store._save(self, replace=True, ids=self._ids)
+
+    # Add newly found items. The cursor is only updated if given.
+    def add(self, ids, cursor=None):
+        new_ids = set(ids) - self._ids
+        self._ids |= new_ids
+        if cursor is not None:
+            self.cursor = cursor
+        if new_ids or cursor is not None:
+            self._store._save(self, replace=False, ids=new_ids)
+
+
+# Library snapshots for any number of users, in a sqlite database next to the
+# response caches. Snapshots stay loaded once read.
+class LibraryStore:
+    @staticmethod
+    def open(cache_dir=DEFAULT_CACHE_DIR, filename=FILENAME):
+        os.makedirs(cache_dir, exist_ok=True)
+        return LibraryStore(os.path.join(cache_dir, filename))
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+            owner TEXT PRIMARY KEY,
+            cursor TEXT,
+            synced REAL)""")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS items (
+            owner TEXT NOT NULL,
+            id TEXT NOT NULL,
+            PRIMARY KEY (owner, id)) WITHOUT ROWID""")
+        self._conn.commit()
+
+    def snapshot(self, owner):
+        with self._lock:
+            snapshot = self._snapshots.get(owner)
+            if snapshot is None:
+                row = self._conn.execute("SELECT cursor, synced FROM snapshots WHERE owner = ?", (owner, )).fetchone()
+                cursor, synced = row or (None, None)
+                ids = [id for id, in self._conn.execute("SELECT id FROM items WHERE owner = ?", (owner, ))]
+                snapshot = self._snapshots[owner] = LibrarySnapshot(self, owner, ids, cursor, synced)
+            return snapshot
+
+    def _save(self, snapshot, *, replace, ids):
+        with self._lock:
+            if replace:
+                self._conn.execute("DELETE FROM items WHERE owner = ?", (snapshot.owner, ))
+            self._conn.executemany("INSERT OR IGNORE INTO items (owner, id) VALUES (?, ?)", ((snapshot.owner, id) for id in ids))
+            self._conn.execute("INSERT OR REPLACE INTO snapshots (owner, cursor, synced) VALUES (?, ?, ?)", (snapshot.owner, snapshot.cursor, snapshot.synced))
+            self._conn.commit()
+
+
+def open_library_store(cache_dir=DEFAULT_CACHE_DIR, use_cache=True):
+    if not use_cache:
+        return LibraryStore()
+    return LibraryStore.open(cache_dir or DEFAULT_CACHE_DIR)
@@ -0,0 +1,114 @@
+import collections
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency_sum = 0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.bytes_received = 0
+        self.retries = 0
+        self.rate_limit_sleep = 0
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_sum": self.latency_sum,
+            "latency_buckets": {str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets)},
+            "bytes_received": self.bytes_received,
+            "retries": self.retries,
+            "rate_limit_sleep": self.rate_limit_sleep
+        }
+
+
+# Request statistics per service and endpoint. The clients record into the
+# process-wide instance below, which can be read back at any point.
+class Metrics:
+    def __init__(self):
+        self._stats = collections.defaultdict(EndpointStats)
+        self._lock = threading.Lock()
+
+    def record_request(self, service, endpoint, latency, bytes_received=0, error=False):
+        with self._lock:
+            stats = self._stats[(service, endpoint)]
+            stats.requests += 1
+            stats.errors += 1 if error else 0
+            stats.latency_sum += latency
+            stats.bytes_received += bytes_received
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    stats.latency_buckets[index] += 1
+                    break
+
+    def record_retry(self, service, endpoint):
+        with self._lock:
+            self._stats[(service, endpoint)].retries += 1
+
+    def record_sleep(self, service, endpoint, seconds):
+        if seconds > 0:
+            with self._lock:
+                self._stats[(service, endpoint)].rate_limit_sleep += seconds
+
+    # Time the body of the with statement as a request. The yielded dict can
+    # be updated with the "bytes_received" once they're known. An exception
+    # counts as an error.
+    @contextmanager
+    def time_request(self, service, endpoint):
+        info = {"bytes_received": 0, "error": False}
+        start = time.perf_counter()
+        try:
+            yield info
+        except Exception:
+            info["error"] = True
+            raise
+        finally:
+            self.record_request(service, endpoint, time.perf_counter() - start, info["bytes_received"], info["error"])
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = collections.defaultdict(dict)
+            for (service, endpoint), stats in sorted(self._stats.items()):
+                snapshot[service][endpoint] = stats.to_dict()
+            return dict(snapshot)
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    # Prometheus text exposition format. Each metric's samples are grouped
+    # under its TYPE line, as the format requires.
+    def to_prometheus(self):
+        series = [(f'service="{service}",endpoint="{endpoint}"', stats) for service, endpoints in self.snapshot().items() for endpoint, stats in endpoints.items()]
+
+        lines = []
+        for name, field in (("requests_total", "requests"), ("request_errors_total", "errors"), ("bytes_received_total", "bytes_received"),
+                            ("retries_total", "retries"), ("rate_limit_sleep_seconds_total", "rate_limit_sleep")):
+            lines.append(f"# TYPE playlistmanager_{name} counter")
+            lines.extend(f"playlistmanager_{name}{{{labels}}} {stats[field]}" for labels, stats in series)
+
+        lines.append("# TYPE playlistmanager_request_latency_seconds histogram")
+        for labels, stats in series:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats["latency_buckets"].values()):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else str(bound)
+                lines.append(f'playlistmanager_request_latency_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"playlistmanager_request_latency_seconds_sum{{{labels}}} {stats['latency_sum']}")
+            lines.append(f"playlistmanager_request_latency_seconds_count{{{labels}}} {stats['requests']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
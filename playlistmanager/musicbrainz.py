@@ -1,12 +1,37 @@
 import collections
+import concurrent.futures
+import heapq
+import itertools
 import requests
-import time
-from operator import itemgetter
+import threading
+from functools import total_ordering
 
 from playlistmanager import __version__
+from playlistmanager.cache import DEFAULT_CACHE_DIR, cache_key, open_cache
+from playlistmanager.metrics import metrics
+from playlistmanager.ratelimit import RetryPolicy, retry_after, shared_limiter
 
 DEFAULT_USER_AGENT = f"PlaylistManager/{__version__} (github.com/Auzzy/playlist-manager)"
 
+# How long a cached response is considered fresh, keyed by the resource being
+# requested. Artists rarely change, while new releases show up regularly.
+CACHE_TTLS = {
+    "artist": 7 * 24 * 60 * 60,
+    "release-group": 24 * 60 * 60
+}
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+
+# MusicBrainz allows an average of 1 request per second per client, and
+# responds with 503 when that's exceeded.
+RATE_LIMIT = 1
+RETRY_STATUSES = (429, 503)
+
+# Release group fields, mapped to their name in the search index.
+SEARCH_FIELDS = {
+    "primary-type": "primarytype",
+    "secondary-types": "secondarytype"
+}
+
 
 class Filter:
     @staticmethod
@@ -29,22 +54,52 @@ class Filter:
 
         request_args["types"].add("album")
 
-        return Filter(request_args, request_filter)
+        return Filter(request_args, request_filter, filter_args.get("server_filter", True))
 
-    def __init__(self, request_args, request_filter):
+    def __init__(self, request_args, request_filter, server_filter=True):
         self.request_args = request_args
         self.request_filter = request_filter
+        self.server_filter = server_filter
+
+        # Compiled once, so filtering is a single pass over the items.
+        self._excluded = [(field, frozenset(values)) for field, values in request_filter.items() if values]
 
     def get_request_args(self):
         return {"types": self.request_args["types"].copy()}
 
+    # The browse endpoint can only filter on type, so any exclusions would
+    # have to be downloaded and filtered out afterwards. The search endpoint
+    # can exclude them up front, so when there's something to exclude, this
+    # produces the equivalent Lucene query. Returns None if browsing is enough.
+    def get_search_query(self, artist_id):
+        if not self.server_filter or not self._excluded:
+            return None
+
+        clauses = [f"arid:{artist_id}"]
+        clauses.append("(" + " OR ".join(f"{SEARCH_FIELDS['primary-type']}:{type_}" for type_ in sorted(self.request_args["types"])) + ")")
+        for field, values in self._excluded:
+            clauses.extend(f"NOT {SEARCH_FIELDS[field]}:\"{value.lower()}\"" for value in sorted(values))
+        return " AND ".join(clauses)
+
+    def matches(self, item):
+        return not any(excluded.intersection(item.get(field, ())) for field, excluded in self._excluded)
+
+    # Still applied to search results, as a guard against the search index
+    # matching more loosely than expected.
     def post_request_filter(self, items):
-        filtered_items = []
-        for field, values in self.request_filter.items():
-            for item in items[:]:
-                if not any(value in item[field] for value in values):
-                    filtered_items.append(item)
-        return filtered_items
+        return [item for item in items if self.matches(item)]
+
+
+@total_ordering
+class _Descending:
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return self.value > other.value
 
 
 class Sorter:
@@ -52,17 +107,44 @@ class Sorter:
     SORT_ORDER_DESC  ="desc"
     SORT_ORDERS = (SORT_ORDER_ASC, SORT_ORDER_DESC)
 
-    def __init__(self, field, order):
+    # Items missing the field, or with it empty, sort as if it were missing.
+    # Search results leave out empty fields, where browse results have them
+    # empty, so both sort the same way.
+    def __init__(self, field, order, buffer_size=None, missing=""):
         self.field = field
         # Default to ascending
         self.order = Sorter.SORT_ORDER_DESC if order in ("desc", "descending") else Sorter.SORT_ORDER_ASC
+        self.buffer_size = buffer_size
+        self.missing = missing
 
-        self._key_func = itemgetter(self.field) if self.field else None
+        self._key_func = (lambda item: item.get(self.field) or self.missing) if self.field else None
         self._asc = self.order == Sorter.SORT_ORDER_ASC
 
     def sort(self, items):
         return sorted(items, key=self._key_func, reverse=not self._asc) if self._key_func else items
 
+    # Sort items as they arrive. Without a buffer size, nothing can be emitted
+    # until every item has been seen. With one, items are emitted once the
+    # buffer fills, so the result is only fully sorted if out-of-order items
+    # arrive within buffer_size of where they belong.
+    def sort_stream(self, items):
+        if not self._key_func:
+            yield from items
+        elif not self.buffer_size:
+            yield from self.sort(items)
+        else:
+            wrap_key = (lambda value: value) if self._asc else _Descending
+
+            # The counter breaks ties by arrival order, matching sorted().
+            buffer = []
+            for count, item in enumerate(items):
+                heapq.heappush(buffer, (wrap_key(self._key_func(item)), count, item))
+                if len(buffer) > self.buffer_size:
+                    yield heapq.heappop(buffer)[2]
+
+            while buffer:
+                yield heapq.heappop(buffer)[2]
+
 class AlbumSorter(Sorter):
     SORT_FIELDS = {
         "name": "title",
@@ -70,11 +152,16 @@ class AlbumSorter(Sorter):
         "type": "primary-type",
         "subtypes": "secondary-types"
     }
+    # What a missing field sorts as, if not "".
+    MISSING_VALUES = {
+        "secondary-types": []
+    }
 
     @staticmethod
     def create(**sort_args):
         sort_field = sort_args.get("sort_field", "release")
         sort_order = sort_args.get("sort_order") or Sorter.SORT_ORDER_ASC
+        sort_buffer = sort_args.get("sort_buffer")
 
         if sort_field:
             sort_value = AlbumSorter.SORT_FIELDS.get(sort_field)
@@ -86,32 +173,118 @@ class AlbumSorter(Sorter):
         if sort_order not in Sorter.SORT_ORDERS:
             raise ValueError(f"Unexpected sort order. Expected one of: {', '.join(Sorter.SORT_ORDERS)}")
 
-        return AlbumSorter(sort_value, sort_order)
+        return AlbumSorter(sort_value, sort_order, sort_buffer, AlbumSorter.MISSING_VALUES.get(sort_value, ""))
+
+
+# Collects the lookups needed for a set of entities and merges the ones for the
+# same entity into a single request, using the union of their "inc" values.
+# MusicBrainz returns the same base entity regardless of "inc", so one richer
+# request can stand in for several plain ones.
+class LookupPlanner:
+    def __init__(self, musicbrainz):
+        self.musicbrainz = musicbrainz
+        self._includes = {}
+
+    def add(self, resource, id, inc=None):
+        includes = self._includes.setdefault((resource, id), set())
+        if inc:
+            includes.update(inc.split("+"))
+        return self
+
+    def execute(self):
+        return {(resource, id): self.musicbrainz.lookup(resource, id, inc="+".join(sorted(includes)) or None)
+                for (resource, id), includes in self._includes.items()}
+
+
+def _links_from_relations(relations):
+    relations_by_type = collections.defaultdict(list)
+    for relation in relations:
+        if "url" in relation:
+            relations_by_type[relation["type"]].append(relation["url"]["resource"])
+    return dict(relations_by_type)
 
 
 class MusicBrainz:
     BASE_API = "https://musicbrainz.org/ws/2"
 
     @staticmethod
-    def connect(user_agent=DEFAULT_USER_AGENT):
+    def connect(user_agent=DEFAULT_USER_AGENT, *, cache_dir=DEFAULT_CACHE_DIR, use_cache=True, limiter=None, retry_policy=None, offline_db=None):
         session = requests.Session()
         session.headers.update({
             "User-Agent": user_agent,
             "Accept": "application/json"
         })
-        return MusicBrainz(session)
+        musicbrainz = MusicBrainz(session, open_cache(cache_dir, use_cache), limiter, retry_policy)
+
+        # Whatever the offline database can't answer still goes to the web
+        # service.
+        if offline_db:
+            from playlistmanager.musicbrainz_offline import OfflineMusicBrainz
+            return OfflineMusicBrainz.open(offline_db, musicbrainz)
+        return musicbrainz
 
-    def __init__(self, session):
+    def __init__(self, session, cache=None, limiter=None, retry_policy=None):
         self.session = session
+        self.cache = cache or open_cache(use_cache=False)
+        self.limiter = limiter or shared_limiter("musicbrainz", RATE_LIMIT)
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
 
     def _request(self, endpoint, params={}):
+        key = cache_key(endpoint, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        # When several threads make the same request at once, only the first
+        # one actually sends it and the rest wait on its result.
+        with self._in_flight_lock:
+            in_flight = self._in_flight.get(key)
+            if not in_flight:
+                future = self._in_flight[key] = concurrent.futures.Future()
+        if in_flight:
+            return in_flight.result()
+
+        try:
+            result = self._send_request(endpoint, params, key)
+            future.set_result(result)
+            return result
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+
+    def _send_request(self, endpoint, params, key):
+        # Group lookups of different entities together, and keep searches
+        # separate from browsing.
+        resource, _, id = endpoint.partition("/")
+        label = f"{resource}/{{id}}" if id else (f"{resource}?query" if "query" in params else resource)
+
+        attempt = 0
         while True:
-            response = self.session.get(f"{MusicBrainz.BASE_API}/{endpoint}", params={**params, "fmt": "json"})
-            if response.status_code != 503:
+            metrics.record_sleep("musicbrainz", label, self.limiter.acquire())
+            with metrics.time_request("musicbrainz", label) as request_info:
+                response = self.session.get(f"{MusicBrainz.BASE_API}/{endpoint}", params={**params, "fmt": "json"})
+                request_info.update({"bytes_received": len(response.content), "error": not response.ok})
+            if response.status_code not in RETRY_STATUSES:
                 break
 
-            time.sleep(1)
-        return response.json()
+            if attempt >= self.retry_policy.max_retries:
+                response.raise_for_status()
+
+            metrics.record_retry("musicbrainz", label)
+            self.limiter.defer(retry_after(response) or self.retry_policy.delay(attempt))
+            attempt += 1
+
+        result = response.json()
+        if response.ok:
+            resource = endpoint.split("/", 1)[0]
+            self.cache.set(key, result, CACHE_TTLS.get(resource, DEFAULT_CACHE_TTL))
+        return result
 
     def search_artist(self, name, threshhold=0):
         search_name = name.replace(" ", "+")
@@ -132,52 +305,92 @@ class MusicBrainz:
                 "artist": artist_id,
                 "collection_id": collection_id,
                 "release": release_id,
-                "type": '|'.join(types),
+                "type": '|'.join(sorted(types)),
                 "status": status
             },
             **kwargs)
 
+    def search_release_groups(self, query, *, limit=25, offset=0):
+        return self._request("release-group", {"query": query, "limit": limit, "offset": offset})
+
     ### Higher-level operations
 
     def get_artist(self, artist_id):
         return self.lookup("artist", artist_id)
 
-    def get_all_artist_albums(self, artist_id, *, filter_=Filter.create(), sorter=AlbumSorter.create()):
-        all_albums = []
+    def _iter_release_group_pages(self, artist_id, filter_):
+        search_query = filter_.get_search_query(artist_id)
+        offset = 0
         while True:
-            params = {
-                "artist_id": artist_id,
-                "limit": 100,
-                "offset": len(all_albums),
-                **filter_.get_request_args()
-            }
-            albums_result = self.browse_release_groups(**params)
-            all_albums.extend(albums_result["release-groups"])
-            if len(all_albums) >= albums_result["release-group-count"]:
+            if search_query:
+                albums_result = self.search_release_groups(search_query, limit=100, offset=offset)
+                total = albums_result["count"]
+            else:
+                params = {
+                    "artist_id": artist_id,
+                    "limit": 100,
+                    "offset": offset,
+                    **filter_.get_request_args()
+                }
+                albums_result = self.browse_release_groups(**params)
+                total = albums_result["release-group-count"]
+            yield albums_result["release-groups"]
+
+            offset += len(albums_result["release-groups"])
+            if not albums_result["release-groups"] or offset >= total:
                 break
 
-            # Slow down to avoid exceeding the rate limit
-            time.sleep(2)
+    def _iter_filtered_albums(self, artist_id, filter_):
+        pages = self._iter_release_group_pages(artist_id, filter_)
+        return itertools.chain.from_iterable(filter_.post_request_filter(page) for page in pages)
 
-        all_albums = filter_.post_request_filter(all_albums)
-        all_albums = sorter.sort(all_albums)
-        return all_albums
+    def get_all_artist_albums(self, artist_id, *, filter_=Filter.create(), sorter=AlbumSorter.create()):
+        return sorter.sort(list(self._iter_filtered_albums(artist_id, filter_)))
 
-    def get_artist_albums_info(self, artist_id, release_filter=Filter.create(), album_sorter=AlbumSorter.create()):
-        albums_info = self.get_all_artist_albums(artist_id, filter_=release_filter, sorter=album_sorter)
+    # Yields albums as each page arrives, rather than after the last one. See
+    # Sorter.sort_stream() for how sorting affects that.
+    def iter_artist_albums(self, artist_id, *, filter_=Filter.create(), sorter=AlbumSorter.create()):
+        return sorter.sort_stream(self._iter_filtered_albums(artist_id, filter_))
 
+    @staticmethod
+    def _album_info(album):
         # The name an artist uses for a release may be an alias. Since Pandora
         # treats different names as separate artists (usually), the name on the
         # release needs to be used for searching. That's also why we use
         # "artist-credit.*.name" instead of "artist-credit.*.artist.name"
+        return {
+            "artists": [artist["name"] for artist in album["artist-credit"]],
+            "title": album["title"],
+            # Search results omit aliases when there are none.
+            "aliases": [alias["name"] for alias in album.get("aliases", [])]
+        }
+
+    def get_artist_albums_info(self, artist_id, release_filter=Filter.create(), album_sorter=AlbumSorter.create()):
+        albums_info = self.get_all_artist_albums(artist_id, filter_=release_filter, sorter=album_sorter)
+
         # Keeping it a list retains the order returned by get_all_artist_albums().
-        get_artist_names = lambda album: [artist["name"] for artist in album["artist-credit"]]
-        get_album_aliases = lambda album: [alias["name"] for alias in album["aliases"]]
-        return [{"artists": get_artist_names(album), "title": album["title"], "aliases": get_album_aliases(album)} for album in albums_info]
+        return [MusicBrainz._album_info(album) for album in albums_info]
+
+    def iter_artist_albums_info(self, artist_id, release_filter=Filter.create(), album_sorter=AlbumSorter.create()):
+        return (MusicBrainz._album_info(album) for album in self.iter_artist_albums(artist_id, filter_=release_filter, sorter=album_sorter))
 
     def get_artist_links(self, id):
-        relations = self.lookup("artist", id, inc="url-rels")["relations"]
-        relations_by_type = collections.defaultdict(list)
-        for relation in relations:
-            relations_by_type[relation["type"]].append(relation["url"]["resource"])
-        return dict(relations_by_type)
+        return _links_from_relations(self.lookup("artist", id, inc="url-rels")["relations"])
+
+    # Everything the playlist builders need to know about an artist, from a
+    # single lookup per artist.
+    def get_artists_info(self, artist_ids):
+        planner = LookupPlanner(self)
+        for artist_id in artist_ids:
+            planner.add("artist", artist_id, "aliases").add("artist", artist_id, "url-rels")
+        artists = planner.execute()
+
+        return [{
+                "id": artist_id,
+                "name": artists[("artist", artist_id)]["name"],
+                "aliases": [alias["name"] for alias in artists[("artist", artist_id)].get("aliases", [])],
+                "links": _links_from_relations(artists[("artist", artist_id)].get("relations", []))
+            } for artist_id in artist_ids]
+
+    def get_artist_info(self, artist_id):
+        return self.get_artists_info([artist_id])[0]
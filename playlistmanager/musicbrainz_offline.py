@@ -0,0 +1,218 @@
+import io
+import json
+import re
+import sqlite3
+import tarfile
+import threading
+
+from playlistmanager.musicbrainz import MusicBrainz
+
+# Only the parts of each entity which the playlist builders use are kept, in
+# the same shape the web service returns them.
+ARTIST_FIELDS = ("id", "name", "sort-name", "disambiguation", "country", "type", "aliases")
+RELEASE_GROUP_FIELDS = ("id", "title", "primary-type", "secondary-types", "first-release-date", "artist-credit", "aliases")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artist (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS artist_name (
+    artist_id TEXT NOT NULL,
+    name TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS artist_name_name ON artist_name (name);
+CREATE INDEX IF NOT EXISTS artist_name_artist ON artist_name (artist_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS artist_name_search USING fts5 (
+    name,
+    artist_id UNINDEXED,
+    tokenize = "unicode61 remove_diacritics 2",
+    prefix = "2 3");
+CREATE TABLE IF NOT EXISTS release_group (
+    id TEXT PRIMARY KEY,
+    primary_type TEXT,
+    data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS release_group_artist (
+    release_group_id TEXT NOT NULL,
+    artist_id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS release_group_artist_artist ON release_group_artist (artist_id);
+CREATE INDEX IF NOT EXISTS release_group_artist_release_group ON release_group_artist (release_group_id);
+"""
+
+# Search scores, mimicking the web service's 0-100 scale.
+EXACT_SCORE = 100
+PREFIX_SCORE = 90
+WORD_SCORE = 80
+SEARCH_LIMIT = 25
+# How many of the best full-text matches are scored, before grouping them by
+# artist.
+SEARCH_CANDIDATES = 500
+_SEARCH_WORD_RE = re.compile(r"\w+")
+
+
+def _normalize_name(name):
+    return " ".join(name.casefold().split())
+
+# The JSON dumps are distributed as tarballs (e.g. artist.tar.xz), containing
+# one JSON document per line in mbdump/<entity>. Either the tarball or the
+# extracted file can be given.
+def _iter_dump(path, entity):
+    if tarfile.is_tarfile(path):
+        with tarfile.open(path) as tar:
+            with io.TextIOWrapper(tar.extractfile(f"mbdump/{entity}"), encoding="utf-8") as dump:
+                yield from (json.loads(line) for line in dump if line.strip())
+    else:
+        with open(path, encoding="utf-8") as dump:
+            yield from (json.loads(line) for line in dump if line.strip())
+
+def _import_artists(conn, path):
+    count = 0
+    for artist in _iter_dump(path, "artist"):
+        data = {field: artist[field] for field in ARTIST_FIELDS if field in artist}
+        data["relations"] = [relation for relation in artist.get("relations", []) if "url" in relation]
+
+        names = {_normalize_name(artist["name"])} | {_normalize_name(alias["name"]) for alias in artist.get("aliases", [])}
+        # The full-text rows share their rowid with the artist_name rows, since
+        # the full-text table can only be looked up by rowid or by MATCH.
+        conn.execute("DELETE FROM artist_name_search WHERE rowid IN (SELECT rowid FROM artist_name WHERE artist_id = ?)", (artist["id"], ))
+        conn.execute("DELETE FROM artist_name WHERE artist_id = ?", (artist["id"], ))
+        conn.execute("INSERT OR REPLACE INTO artist (id, data) VALUES (?, ?)", (artist["id"], json.dumps(data)))
+        conn.executemany("INSERT INTO artist_name (artist_id, name) VALUES (?, ?)", [(artist["id"], name) for name in names])
+        conn.execute("INSERT INTO artist_name_search (rowid, artist_id, name) SELECT rowid, artist_id, name FROM artist_name WHERE artist_id = ?", (artist["id"], ))
+        count += 1
+    return count
+
+def _import_release_groups(conn, path):
+    count = 0
+    for release_group in _iter_dump(path, "release-group"):
+        data = {field: release_group[field] for field in RELEASE_GROUP_FIELDS if field in release_group}
+        primary_type = (release_group.get("primary-type") or "").lower()
+        artist_ids = {credit["artist"]["id"] for credit in release_group.get("artist-credit", [])}
+
+        conn.execute("DELETE FROM release_group_artist WHERE release_group_id = ?", (release_group["id"], ))
+        conn.execute("INSERT OR REPLACE INTO release_group (id, primary_type, data) VALUES (?, ?, ?)", (release_group["id"], primary_type, json.dumps(data)))
+        conn.executemany("INSERT INTO release_group_artist (release_group_id, artist_id) VALUES (?, ?)", [(release_group["id"], artist_id) for artist_id in artist_ids])
+        count += 1
+    return count
+
+# Databases imported before artist names were indexed for full-text search get
+# the index built from the names they already have.
+def _create_schema(conn):
+    conn.executescript(SCHEMA)
+    if not conn.execute("SELECT 1 FROM artist_name_search LIMIT 1").fetchone():
+        with conn:
+            conn.execute("INSERT INTO artist_name_search (rowid, artist_id, name) SELECT rowid, artist_id, name FROM artist_name")
+
+# The full-text query for a name: each of its words, the last of which may be
+# incomplete.
+def _search_query(search_name):
+    words = _SEARCH_WORD_RE.findall(search_name)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+# Import the artist and/or release-group JSON dumps into the database at
+# db_path, creating it if needed. Entities already present are replaced, so a
+# newer dump can be imported over an older one.
+def import_dumps(db_path, *, artist_dump=None, release_group_dump=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        _create_schema(conn)
+        counts = {}
+        with conn:
+            if artist_dump:
+                counts["artist"] = _import_artists(conn, artist_dump)
+            if release_group_dump:
+                counts["release-group"] = _import_release_groups(conn, release_group_dump)
+        return counts
+    finally:
+        conn.close()
+
+
+# Serves MusicBrainz data from a database built by import_dumps(), instead of
+# the web service. There's no rate limit to respect, so every query is as fast
+# as the disk. Requests the database can't answer, such as searching release
+# groups or looking up other entities, go to the online client if one is
+# given, and otherwise raise NotImplementedError.
+class OfflineMusicBrainz(MusicBrainz):
+    @staticmethod
+    def open(db_path, online=None):
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        _create_schema(conn)
+        return OfflineMusicBrainz(conn, online)
+
+    def __init__(self, conn, online=None):
+        super().__init__(session=None)
+        self.conn = conn
+        self.online = online
+        self._lock = threading.Lock()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _request(self, endpoint, params={}):
+        if self.online:
+            return self.online._request(endpoint, params)
+        raise NotImplementedError(f"The offline MusicBrainz database cannot serve \"{endpoint}\" requests.")
+
+    # Matches names containing each word of the search, the last as a prefix,
+    # using the full-text index. If nothing matches, such as when only the
+    # release groups were imported, the online client is searched instead.
+    def search_artist(self, name, threshhold=0):
+        search_name = _normalize_name(name)
+        query = _search_query(search_name)
+        rows = self._search_artist_rows(search_name, query) if query else []
+        if not rows and self.online:
+            return self.online.search_artist(name, threshhold)
+
+        artists = [{**json.loads(data), "score": score} for data, score in rows]
+        return [artist for artist in artists if artist["score"] >= threshhold]
+
+    def _search_artist_rows(self, search_name, query):
+        return self._query("""
+            SELECT artist.data, MAX(CASE
+                WHEN candidate.name = ? THEN ?
+                WHEN substr(candidate.name, 1, ?) = ? THEN ?
+                ELSE ? END) AS score
+            FROM (
+                SELECT artist_id, name FROM artist_name_search
+                WHERE artist_name_search MATCH ?
+                ORDER BY rank
+                LIMIT ?) AS candidate
+            JOIN artist ON artist.id = candidate.artist_id
+            GROUP BY artist.id
+            ORDER BY score DESC
+            LIMIT ?""",
+            (search_name, EXACT_SCORE, len(search_name), search_name, PREFIX_SCORE, WORD_SCORE, query, SEARCH_CANDIDATES, SEARCH_LIMIT))
+
+    # Every lookup includes the aliases and URL relations, whatever inc asks for.
+    def lookup(self, resource, id, *, inc=None):
+        rows = []
+        if resource in ("artist", "release-group"):
+            table = resource.replace("-", "_")
+            rows = self._query(f"SELECT data FROM {table} WHERE id = ?", (id, ))
+        if rows:
+            return json.loads(rows[0][0])
+
+        if self.online:
+            return self.online.lookup(resource, id, inc=inc)
+        if resource not in ("artist", "release-group"):
+            raise NotImplementedError(f"The offline MusicBrainz database does not contain {resource} entities.")
+        raise ValueError(f"No {resource} with ID {id} in the offline MusicBrainz database.")
+
+    # Everything comes back in one page, so the filter's search query is moot.
+    # An artist with no release groups at all in the database, of any type,
+    # wasn't in the dump that was imported, so theirs come from the online
+    # client instead.
+    def _iter_release_group_pages(self, artist_id, filter_):
+        if self.online and not self._query("SELECT 1 FROM release_group_artist WHERE artist_id = ? LIMIT 1", (artist_id, )):
+            yield from self.online._iter_release_group_pages(artist_id, filter_)
+            return
+
+        types = sorted(filter_.get_request_args()["types"])
+        rows = self._query(f"""
+            SELECT release_group.data
+            FROM release_group_artist JOIN release_group ON release_group.id = release_group_artist.release_group_id
+            WHERE release_group_artist.artist_id = ? AND release_group.primary_type IN ({", ".join("?" * len(types))})
+            ORDER BY release_group.id""",
+            (artist_id, *types))
+        yield [json.loads(data) for data, in rows]
@@ -0,0 +1,70 @@
+import email.utils
+import threading
+import time
+
+
+class RateLimiter:
+    # A token bucket, tracked as the time the next token becomes available
+    # rather than a token count. Requests reserve their slot under the lock and
+    # sleep outside of it, so threads sharing a limiter are paced fairly.
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            # An idle limiter can accumulate up to capacity tokens.
+            scheduled = max(self._next, now - (self.capacity - 1) / self.rate)
+            self._next = scheduled + 1 / self.rate
+
+        wait = scheduled - now
+        if wait > 0:
+            time.sleep(wait)
+        return max(wait, 0)
+
+    # Hold off every request using this limiter, such as when the server
+    # responds with Retry-After.
+    def defer(self, seconds):
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+class RetryPolicy:
+    def __init__(self, max_retries=5, base_delay=1, max_delay=30):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        return min(self.max_delay, self.base_delay * 2 ** attempt)
+
+
+_SHARED_LIMITERS = {}
+_SHARED_LIMITERS_LOCK = threading.Lock()
+
+# Limiters are shared by name, so every client talking to the same service in
+# this process draws from the same budget.
+def shared_limiter(name, rate, capacity=1):
+    with _SHARED_LIMITERS_LOCK:
+        if name not in _SHARED_LIMITERS:
+            _SHARED_LIMITERS[name] = RateLimiter(rate, capacity)
+        return _SHARED_LIMITERS[name]
+
+def retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0)
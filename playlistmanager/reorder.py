@@ -0,0 +1,144 @@
+import bisect
+
+
+# Returns the indices of one longest strictly increasing subsequence of values,
+# in O(n log n).
+def longest_increasing_subsequence(values):
+    tail_values = []
+    tail_indices = []
+    previous = [None] * len(values)
+    for index, value in enumerate(values):
+        position = bisect.bisect_left(tail_values, value)
+        if position > 0:
+            previous[index] = tail_indices[position - 1]
+
+        if position == len(tail_values):
+            tail_values.append(value)
+            tail_indices.append(index)
+        else:
+            tail_values[position] = value
+            tail_indices[position] = index
+
+    subsequence = []
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        subsequence.append(index)
+        index = previous[index]
+    return subsequence[::-1]
+
+def _current_positions(current_ids, target_ids):
+    positions = {item_id: index for index, item_id in enumerate(current_ids)}
+    missing = [item_id for item_id in target_ids if item_id not in positions]
+    if missing:
+        raise ValueError(f"Cannot reorder items which aren't in the playlist: {', '.join(str(item_id) for item_id in missing)}")
+    return positions
+
+# The items of target_ids which can stay where they are. Everything else needs
+# to move, and there is no smaller set of moves which produces the target order.
+def stationary_items(current_ids, target_ids):
+    positions = _current_positions(current_ids, target_ids)
+    lis = longest_increasing_subsequence([positions[item_id] for item_id in target_ids])
+    return {target_ids[index] for index in lis}
+
+# Counts the occupied slots before a given one, in O(log n).
+class _SlotCounter:
+    def __init__(self, size):
+        self._tree = [0] * (size + 1)
+
+    def add(self, slot, delta):
+        slot += 1
+        while slot < len(self._tree):
+            self._tree[slot] += delta
+            slot += slot & -slot
+
+    def count_before(self, slot):
+        count = 0
+        while slot > 0:
+            count += self._tree[slot]
+            slot -= slot & -slot
+        return count
+
+# Plan the moves which rearrange current_ids so the items in target_ids appear
+# in that order. Items which are not in target_ids are never moved themselves.
+#
+# Each move is [item_id, old_index, new_index], where the indices are positions
+# in the list as it stands after all previous moves have been applied, and
+# new_index is where the item lands once it's been removed from old_index.
+def plan_index_moves(current_ids, target_ids):
+    stationary = stationary_items(current_ids, target_ids)
+    moved = [item_id for item_id in target_ids if item_id not in stationary]
+    if not moved:
+        return []
+
+    # Items are placed in target order, each right after the item preceding it
+    # in the target. The preceding item has either stayed put or already been
+    # placed, so the items placed so far are always in the right order.
+    #
+    # That means every slot an item will ever occupy is known up front: each
+    # item which doesn't move keeps its place, and is followed by the chain of
+    # moved items which are placed after it, each following the last. A moved
+    # item also has a slot where it starts out. Positions in the list are then
+    # counts of the occupied slots before a slot.
+    moved_set = set(moved)
+    successors = {item_id: target_ids[index + 1] for index, item_id in enumerate(target_ids[:-1])}
+    start_slots = {}
+    end_slots = {}
+    slots = 0
+
+    def place_chain(item_id):
+        nonlocal slots
+        while item_id in moved_set:
+            end_slots[item_id] = slots
+            slots += 1
+            item_id = successors.get(item_id)
+
+    place_chain(target_ids[0])
+    occupied = []
+    for item_id in current_ids:
+        if item_id in moved_set:
+            start_slots[item_id] = slots
+        occupied.append(slots)
+        slots += 1
+        if item_id not in moved_set:
+            place_chain(successors.get(item_id))
+
+    counter = _SlotCounter(slots)
+    for slot in occupied:
+        counter.add(slot, 1)
+
+    moves = []
+    for item_id in moved:
+        old_index = counter.count_before(start_slots[item_id])
+        counter.add(start_slots[item_id], -1)
+        new_index = counter.count_before(end_slots[item_id])
+        counter.add(end_slots[item_id], 1)
+        moves.append([item_id, old_index, new_index])
+    return moves
+
+# Plan the moves which rearrange current_ids into target_ids, for services
+# which move an item by placing it before another one. Each move is
+# (item_id, successor_id), and the moves must be applied in order.
+#
+# Nothing can be moved after the final item, so it always stays put, and the
+# rest of the stationary items are chosen from those which precede it.
+def plan_successor_moves(current_ids, target_ids):
+    if not target_ids:
+        return []
+
+    positions = _current_positions(current_ids, target_ids)
+    last_position = positions[target_ids[-1]]
+    candidates = [index for index, item_id in enumerate(target_ids[:-1]) if positions[item_id] < last_position]
+    lis = longest_increasing_subsequence([positions[target_ids[index]] for index in candidates])
+    stationary = {target_ids[candidates[index]] for index in lis} | {target_ids[-1]}
+
+    # Working backwards, each item's successor has either stayed put or has
+    # already been placed, so the items placed so far are in the right order.
+    moves = []
+    for target_index in range(len(target_ids) - 2, -1, -1):
+        item_id = target_ids[target_index]
+        if item_id not in stationary:
+            moves.append((item_id, target_ids[target_index + 1]))
+    return moves
+
+def chunk(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
@@ -1,22 +1,74 @@
-from playlistmanager.services import pandora, youtubemusic
+import collections.abc
+import importlib
 
-_SERVICE_MODULES = (pandora, youtubemusic)
-SERVICE_MAP = {name: service for service in _SERVICE_MODULES for name in service.NAMES}
+# The names and display name of each service are declared here, and the
+# service packages read theirs back with declared_names, so listing the
+# services doesn't import them along with their dependencies. A service's
+# package is only imported once it's actually used.
+_SERVICES = (
+    {"display": "Pandora", "names": ("pandora", ), "module": "playlistmanager.services.pandora"},
+    {"display": "YouTube Music", "names": ("ytm", "youtubemusic", "youtube"), "module": "playlistmanager.services.youtubemusic"}
+)
 
 
-def get_service(service_name):
-    service = SERVICE_MAP.get(service_name.lower())
-    if service:
-        return service
+def declared_names(module_name):
+    service = next(service for service in _SERVICES if service["module"] == module_name)
+    return service["display"], service["names"]
+
+
+# Maps each service name to its package, which is imported when it's looked up.
+class _ServiceMap(collections.abc.Mapping):
+    def __init__(self, services):
+        self._modules = {name: service["module"] for service in services for name in service["names"]}
+
+    def __getitem__(self, name):
+        return importlib.import_module(self._modules[name])
+
+    def __iter__(self):
+        return iter(self._modules)
+
+    def __len__(self):
+        return len(self._modules)
+
+    def __contains__(self, name):
+        return name in self._modules
+
+SERVICE_MAP = _ServiceMap(_SERVICES)
+
 
-    raise ValueError(f"Unsupported service name: {service_name}")
+# A service's display name, names and package, which is imported when it's
+# looked up.
+class _ServiceInfo(collections.abc.Mapping):
+    _KEYS = ("display", "names", "package")
+
+    def __init__(self, service):
+        self._service = service
+
+    def __getitem__(self, key):
+        if key == "package":
+            return importlib.import_module(self._service["module"])
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return self._service[key]
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __contains__(self, key):
+        return key in self._KEYS
+
+    def __repr__(self):
+        return f"_ServiceInfo(display={self._service['display']!r}, names={self._service['names']!r})"
+
+
+def get_service(service_name):
+    try:
+        return SERVICE_MAP[service_name.lower()]
+    except KeyError:
+        raise ValueError(f"Unsupported service name: {service_name}") from None
 
 def supported_services_info():
-    def service_to_info(service):
-        return {
-            "display": service.DISPLAY_NAME,
-            "names": service.NAMES,
-            "package": service
-        }
-
-    return [service_to_info(service) for service in _SERVICE_MODULES]
+    return [_ServiceInfo(service) for service in _SERVICES]
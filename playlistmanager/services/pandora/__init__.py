@@ -1,27 +1,34 @@
 import collections
 import itertools
 
+from playlistmanager.clientpool import ClientPool
+from playlistmanager.services import declared_names
 from playlistmanager.services.pandora.client import Pandora
 
-DISPLAY_NAME = "Pandora"
-NAMES = ("pandora", )
+DISPLAY_NAME, NAMES = declared_names(__name__)
 
 def auth_to_config(token):
     return {"auth_token": token} if token else {}
 
+# Clients are kept warm between operations, holding on to their connections
+# and tokens. An expired login is renewed by the client itself, and a client
+# whose token was refused without it being able to log in again is replaced.
+_clients = ClientPool(lambda client_config: Pandora.connect(**client_config), health_check=lambda pandora: pandora.authenticated)
+
 def create_client(client_config):
-    return Pandora.connect(**client_config)
+    return _clients.get(client_config)
 
-def _create_pandora_playlist(search_name, album_ids, name_format, client_config={}, *, client=None):
+def _create_pandora_playlist(search_name, album_ids, name_format, client_config={}, *, client=None, track_counts={}):
     pandora = client or create_client(client_config)
 
     playlist_name = name_format.format(artist=search_name)
-    playlist_info = client.playlist_create(playlist_name)
-    pandora.playlist_append(playlist_info, album_ids, update_info=True)
+    playlist_info = pandora.playlist_create(playlist_name)
+    pandora.playlist_append(playlist_info, album_ids, update_info=True, track_counts=track_counts)
     return playlist_name
 
 def _process_albums(albums_by_name):
     album_ids = []
+    track_counts = {}
     for name, albums in albums_by_name.items():
         if not albums:
             print(f"Could not find \"{name}\" on Pandora. Skipping.")
@@ -33,8 +40,9 @@ def _process_albums(albums_by_name):
                 continue
 
             album_ids.append(album["pandoraId"])
+            track_counts[album["pandoraId"]] = album.get("trackCount")
 
-    return album_ids
+    return album_ids, track_counts
 
 def _get_pandora_albums(pandora, albums_info):
     albums_by_artists = collections.defaultdict(set)
@@ -89,7 +97,9 @@ def _get_pandora_albums(pandora, albums_info):
 def _get_album_ids(albums_info, client_config={}, *, client=None):
     pandora = client or create_client(client_config)
 
-    albums = _get_pandora_albums(pandora, albums_info)
+    # Albums are grouped by artist before searching, so the whole list is
+    # needed up front.
+    albums = _get_pandora_albums(pandora, list(albums_info))
     return _process_albums(albums)
 
 def get_similar_artists(artist_id, client_config):
@@ -107,18 +117,18 @@ def search_artists(search_name, client_config):
         choices.append({"id": artist_id, "name": artist_info[artist_id]["name"], "similar": similar_info})
     return choices
 
-def create_discography_playlist(albums_info, artist_links, search_name, client_config, name_format="{artist} Discography"):
-    pandora = create_client(client_config)
+def create_discography_playlist(albums_info, artist_links, search_name, client_config, name_format="{artist} Discography", *, client=None):
+    pandora = client or create_client(client_config)
 
-    album_ids = _get_album_ids(albums_info, client=pandora)
-    return _create_pandora_playlist(search_name, album_ids, name_format, client=pandora)
+    album_ids, track_counts = _get_album_ids(albums_info, client=pandora)
+    return _create_pandora_playlist(search_name, album_ids, name_format, client=pandora, track_counts=track_counts)
 
-def create_similar_artists_playlist(albums_info_by_artist, search_name, client_config, name_format="{artist} Similar Artists"):
-    pandora = create_client(client_config)
+def create_similar_artists_playlist(albums_info_by_artist, search_name, client_config, name_format="{artist} Similar Artists", *, client=None):
+    pandora = client or create_client(client_config)
 
     albums_info = list(itertools.chain.from_iterable(info["albums"] for info in albums_info_by_artist.values()))
-    album_ids = _get_album_ids(albums_info, client=pandora)
-    return _create_pandora_playlist(search_name, album_ids, name_format, client=pandora)
+    album_ids, track_counts = _get_album_ids(albums_info, client=pandora)
+    return _create_pandora_playlist(search_name, album_ids, name_format, client=pandora, track_counts=track_counts)
 
 
 ##### web app operations #####
@@ -132,7 +142,7 @@ def add_playlist_tracks_to_library(playlist_id, track_nums, client_config):
     pandora = create_client(client_config)
 
     playlist_info = pandora.get_playlist_info(playlist_id)
-    pandora.library_add_from_playlist(playlist_info, track_nums)
+    return pandora.library_add_from_playlist(playlist_info, track_nums)
 
 def get_playlists_info(client_config):
     def extract_playlist_info(pandora_playlists, playlist):
@@ -1,9 +1,20 @@
+import collections
+import concurrent.futures
 import json
 import math
 import os
 import requests
+import threading
 import time
 
+from playlistmanager.albummatch import TitleIndex
+from playlistmanager.cache import DEFAULT_CACHE_DIR, cache_key, open_cache
+from playlistmanager.clientpool import config_key
+from playlistmanager.library import DEFAULT_MAX_AGE as LIBRARY_SNAPSHOT_MAX_AGE, open_library_store
+from playlistmanager.metrics import metrics
+from playlistmanager.ratelimit import RetryPolicy, retry_after
+from playlistmanager.reorder import chunk, plan_index_moves
+
 ALL_SEARCH_TYPES = ["AL", "AR", "CO", "TR", "SF", "PL", "ST", "PC", "PE"]
 SEARCH_ENDPOINT = "v3/sod/search"
 GET_DETAILS_ENDPOINT = "v4/catalog/getDetails"
@@ -35,10 +46,87 @@ RELEASE_TYPES = {
     "OriginalAlbum": 1
 }
 
-# Unclear what the track limit is, but it's between 600 and 878. The request
-# target will be around 500 to give some leeway. If you assume 12 tracks per
-# album, that's 41 or 42 albums, then round down to play it safe.
-MAX_ALBUMS_PER_REQUEST = 40
+# Unclear what the track limit is for appending to a playlist, but it's between
+# 600 and 878. Requests start out targeting 500 tracks to give some leeway,
+# then grow while the server accepts them and halve when it rejects one as too
+# large. Items with an unknown track count are assumed to be a 12 track album.
+APPEND_START_TRACKS = 500
+APPEND_MIN_TRACKS = 50
+APPEND_MAX_TRACKS = 850
+APPEND_GROWTH_TRACKS = 50
+DEFAULT_TRACKS_PER_ITEM = 12
+# A request is only taken to be too large when the server says so, rather than
+# on any client error, such as a stale playlistVersion.
+TOO_LARGE_STATUS = 413
+TOO_LARGE_ERROR_CODES = (1000, )
+# How many times in a row the budget is halved before giving up.
+APPEND_MAX_SHRINKS = 5
+PUSHBACK_STATUSES = (429, 503)
+# Returned once the auth token, or the CSRF token it's tied to, has expired.
+AUTH_EXPIRED_STATUSES = (401, )
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+# Keeps each edit request a reasonable size when reordering a large playlist.
+MAX_MOVES_PER_REQUEST = 100
+# Asked for when listing a playlist's tracks. The server may return fewer.
+PLAYLIST_TRACKS_PAGE_SIZE = 1000
+
+CACHE_FILENAME = "pandora.sqlite3"
+# An album's tracks don't change, so they only expire to keep the cache tidy.
+ALBUM_TRACKS_CACHE_TTL = 30 * 24 * 60 * 60
+DEFAULT_WORKERS = 8
+
+# Enough annotations to cover all but the most prolific artists, so most album
+# names can be resolved from the discography alone.
+DISCOGRAPHY_ANNOTATION_LIMIT = 1000
+# Discography indexes kept per client, least recently used dropped first. A
+# pooled client lives for many operations, so this can't grow with every
+# artist it's ever asked about.
+DISCOGRAPHY_INDEX_CACHE_SIZE = 64
+
+
+# Local matches need to be confident, since a miss just falls back to search.
+DISCOGRAPHY_MATCH_THRESHOLD = 0.85
+
+
+# The albums in an artist's discography, indexed by title, so album names can
+# be resolved without searching for each one.
+class DiscographyIndex:
+    def __init__(self, discography_info):
+        annotations = discography_info.get("annotations", {})
+
+        self.album_ids = set(discography_info["discography"])
+        self._annotations = annotations
+        # When titles tie, the album listed first wins.
+        self._titles = TitleIndex((annotations[album_id]["name"], album_id) for album_id in discography_info["discography"] if album_id in annotations)
+
+    def __contains__(self, album_id):
+        return album_id in self.album_ids
+
+    def find(self, album_name):
+        album_id, _ = self._titles.best_match([album_name], DISCOGRAPHY_MATCH_THRESHOLD)
+        return self._annotations[album_id] if album_id else None
+
+def _rejected_as_too_large(response):
+    if response.status_code == TOO_LARGE_STATUS:
+        return True
+    try:
+        return response.json().get("errorCode") in TOO_LARGE_ERROR_CODES
+    except ValueError:
+        return False
+
+# Take as many items from the front of item_ids as fit in the track budget,
+# and always at least one.
+def _take_batch(item_ids, track_counts, track_budget):
+    batch = []
+    tracks = 0
+    for item_id in item_ids:
+        tracks += track_counts.get(item_id) or DEFAULT_TRACKS_PER_ITEM
+        if batch and tracks > track_budget:
+            break
+        batch.append(item_id)
+    return batch
+
 
 class Pandora:
     BASE = "https://www.pandora.com"
@@ -46,13 +134,9 @@ class Pandora:
 
     @staticmethod
     def connect(**kwargs):
-        session = requests.Session()
-
-        # Retrieve CSRF token
-        cookies = session.head(Pandora.BASE).cookies
-        session.headers.update({"X-CsrfToken": cookies["csrftoken"]})
-
-        pandora = Pandora(session)
+        cache_dir, use_cache = kwargs.get("cache_dir", DEFAULT_CACHE_DIR), kwargs.get("use_cache", True)
+        pandora = Pandora(requests.Session(), open_cache(cache_dir, use_cache, CACHE_FILENAME), open_library_store(cache_dir, use_cache))
+        pandora.refresh_csrf_token()
 
         if "auth_token" in kwargs:
             pandora.session.headers.update({"X-AuthToken": kwargs["auth_token"]})
@@ -61,16 +145,78 @@ class Pandora:
 
         return pandora
 
-    def __init__(self, session):
+    def __init__(self, session, cache=None, library_store=None):
         self.session = session
-
-    def _request(self, endpoint, data):
-        response = self.session.post(f"{Pandora.BASE_API}/{endpoint}", json=data)
-        response.raise_for_status()
-        return response.json()
+        self.cache = cache or open_cache(use_cache=False)
+        self.library_store = library_store or open_library_store(use_cache=False)
+        self._discography_indexes = collections.OrderedDict()
+        self._discography_indexes_lock = threading.Lock()
+        self._append_track_budget = APPEND_START_TRACKS
+        self.retry_policy = RetryPolicy()
+        # Kept when logging in, so an expired auth token can be replaced.
+        self._credentials = None
+        self._auth_lock = threading.Lock()
+        # Set when a request was refused for its auth token and logging in
+        # again wasn't possible or didn't work, so the client is no use until
+        # it logs in.
+        self._auth_rejected = False
+
+    @property
+    def authenticated(self):
+        return "X-AuthToken" in self.session.headers and not self._auth_rejected
+
+    def refresh_csrf_token(self):
+        cookies = self.session.head(Pandora.BASE).cookies
+        self.session.headers.update({"X-CsrfToken": cookies["csrftoken"]})
+
+    # label is how the request is reported in the metrics, if not by endpoint.
+    def _request(self, endpoint, data, *, label=None, reauthenticate=True):
+        auth_token = self.session.headers.get("X-AuthToken")
+        with metrics.time_request("pandora", label or endpoint) as request_info:
+            response = self.session.post(f"{Pandora.BASE_API}/{endpoint}", json=data)
+            request_info["bytes_received"] = len(response.content)
+            if response.status_code not in AUTH_EXPIRED_STATUSES or not reauthenticate or not self._credentials:
+                if response.status_code in AUTH_EXPIRED_STATUSES:
+                    self._auth_rejected = True
+                response.raise_for_status()
+                return response.json()
+            request_info["error"] = True
+
+        # The tokens have expired, so log in again and retry once. Only one
+        # thread logs in; the others find the token already replaced.
+        with self._auth_lock:
+            if self.session.headers.get("X-AuthToken") == auth_token:
+                try:
+                    self.refresh_csrf_token()
+                    self.login(*self._credentials)
+                except Exception:
+                    self._auth_rejected = True
+                    raise
+        return self._request(endpoint, data, label=label, reauthenticate=False)
+
+    # Retry requests which fail for reasons likely to clear up on their own.
+    def _request_with_retry(self, endpoint, data):
+        attempt = 0
+        while True:
+            try:
+                return self._request(endpoint, data)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retry_policy.max_retries:
+                    raise
+                delay = self.retry_policy.delay(attempt)
+            except requests.HTTPError as exc:
+                if exc.response.status_code not in TRANSIENT_STATUSES or attempt >= self.retry_policy.max_retries:
+                    raise
+                delay = retry_after(exc.response) or self.retry_policy.delay(attempt)
+
+            metrics.record_retry("pandora", endpoint)
+            metrics.record_sleep("pandora", endpoint, delay)
+            time.sleep(delay)
+            attempt += 1
 
     def _graphql(self, query, **variables):
-        return self._request(GRAPH_API_ENDPOINT, {"query": query, "variables": json.dumps(variables)})
+        operation = query.split("(", 1)[0].split()[-1]
+        return self._request(GRAPH_API_ENDPOINT, {"query": query, "variables": json.dumps(variables)}, label=f"{GRAPH_API_ENDPOINT}:{operation}")
 
     def login(self, username=None, password=None):
         username = username or os.environ.get("PANDORAUSR")
@@ -78,15 +224,39 @@ class Pandora:
         if not username or not password:
             raise ValueError("Missing Pandora username and password. Expected as either parameters or environment variables.")
 
-        login_result = self._request("v1/auth/login", {"username": username, "password": password})
+        login_result = self._request("v1/auth/login", {"username": username, "password": password}, reauthenticate=False)
         self.session.headers.update({"X-AuthToken": login_result["authToken"]})
+        self._credentials = (username, password)
+        self._auth_rejected = False
 
     def library_add(self, track_id):
-        return self._request(LIBRARY_ADD_ENDPOINT, {"request": {"pandoraId": track_id}})
+        return self._request_with_retry(LIBRARY_ADD_ENDPOINT, {"request": {"pandoraId": track_id}})
 
-    def library_add_bulk(self, track_ids):
+    # Returns a dict listing the track_ids which were "added", "skipped" since
+    # they're already in the library, and "failed" after exhausting retries.
+    def library_add_bulk(self, track_ids, *, workers=DEFAULT_WORKERS, skip_existing=True):
+        track_ids = list(dict.fromkeys(track_ids))
+        library = self.library_snapshot() if skip_existing else ()
+
+        result = {"added": [], "skipped": [], "failed": []}
+        to_add = []
         for track_id in track_ids:
-            self.library_add(track_id)
+            (result["skipped"] if track_id in library else to_add).append(track_id)
+
+        def add(track_id):
+            try:
+                self.library_add(track_id)
+                return True
+            except requests.RequestException:
+                return False
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for track_id, added in zip(to_add, executor.map(add, to_add)):
+                result["added" if added else "failed"].append(track_id)
+
+        if skip_existing:
+            library.add(result["added"])
+        return result
 
     def library_get_items(self, limit=10000, *, cursor=None):
         return self._request(LIBRARY_GET_ENDPOINT, {"request": {"limit": limit, "cursor": cursor}})
@@ -109,7 +279,7 @@ class Pandora:
     # e.g. [[1, 0, 5], [4, 3, 6]]
     def playlist_edit(self, playlist_info, move_set):
         moves = [{"itemId": int(move[0]), "oldIndex": int(move[1]), "newIndex": int(move[2])} for move in move_set]
-        self._request(EDIT_PLAYLIST_ENDPOINT, {"request": {"pandoraId": playlist_info["pandoraId"], "playlistVersion": playlist_info["version"], "moves": moves}})
+        return self._request(EDIT_PLAYLIST_ENDPOINT, {"request": {"pandoraId": playlist_info["pandoraId"], "playlistVersion": playlist_info["version"], "moves": moves}})
 
     # The move_list should be a list. Each element is the list of moves to be
     # made in a single request. Each move is a list, consisting of the itemId,
@@ -117,21 +287,49 @@ class Pandora:
     # e.g. [[[1, 0, 5], [4, 3, 6]], [[3, 1, 9]]]
     def playlist_edit_bulk(self, playlist_info, move_list):
         for move_set in move_list:
-            self.playlist_edit(playlist_info, move_set)
-
-    def playlist_append(self, playlist_info, item_ids, *, update_info=False):
-        # TODO: segment item_ids into albums and tracks, and chop up the
-        # requests accordingly.
+            result = self.playlist_edit(playlist_info, move_set)
+            # Each edit bumps the playlist version, which the next one needs.
+            if isinstance(result, dict) and "version" in result:
+                playlist_info = {**playlist_info, "version": result["version"]}
+        return playlist_info
+
+    # track_counts optionally maps item ids to the number of tracks they add,
+    # such as the "trackCount" of an album annotation.
+    def playlist_append(self, playlist_info, item_ids, *, update_info=False, track_counts={}):
         remaining_item_ids = item_ids[:]
         new_playlist_info = playlist_info.copy()
+        batch_sizes = []
+        attempt = 0
+        shrinks = 0
         while remaining_item_ids:
-            new_playlist_info = self._request(PLAYLIST_APPEND_ENDPOINT, {"pandoraId": new_playlist_info["pandoraId"], "playlistVersion": new_playlist_info["version"], "itemPandoraIds": remaining_item_ids[:MAX_ALBUMS_PER_REQUEST]})
-            remaining_item_ids = remaining_item_ids[MAX_ALBUMS_PER_REQUEST:]
-            time.sleep(5)
+            batch = _take_batch(remaining_item_ids, track_counts, self._append_track_budget)
+            try:
+                new_playlist_info = self._request(PLAYLIST_APPEND_ENDPOINT, {"pandoraId": new_playlist_info["pandoraId"], "playlistVersion": new_playlist_info["version"], "itemPandoraIds": batch})
+            except requests.HTTPError as exc:
+                status = exc.response.status_code
+                if _rejected_as_too_large(exc.response) and len(batch) > 1 and self._append_track_budget > APPEND_MIN_TRACKS and shrinks < APPEND_MAX_SHRINKS:
+                    self._append_track_budget = max(APPEND_MIN_TRACKS, self._append_track_budget // 2)
+                    shrinks += 1
+                    continue
+                if status in PUSHBACK_STATUSES and attempt < self.retry_policy.max_retries:
+                    delay = retry_after(exc.response) or self.retry_policy.delay(attempt)
+                    metrics.record_retry("pandora", PLAYLIST_APPEND_ENDPOINT)
+                    metrics.record_sleep("pandora", PLAYLIST_APPEND_ENDPOINT, delay)
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                raise
+
+            batch_sizes.append(len(batch))
+            remaining_item_ids = remaining_item_ids[len(batch):]
+            self._append_track_budget = min(APPEND_MAX_TRACKS, self._append_track_budget + APPEND_GROWTH_TRACKS)
+            attempt = 0
+            shrinks = 0
+
         if update_info:
             # Update playlist info with new response
             playlist_info.update({key: val for key, val in new_playlist_info.items() if key in playlist_info})
-        return new_playlist_info
+        return {**new_playlist_info, "batchSizes": batch_sizes}
 
     def playlist_create(self, name):
         return self._request(PLAYLIST_CREATE_ENDPOINT, {"details": {"name": name}})
@@ -155,75 +353,117 @@ class Pandora:
         return self._graphql(GRAPH_API_SIMILAR_ARTISTS_QUERY, pandoraId=artist_id)["data"]["entity"]["similarArtists"]
 
     ### Higher-level operations
-    def get_album(self, artist_info, album_name):
-        artist_discography_info = self.get_artist_discography(artist_info["pandoraId"])
-
-        # Uses the search function to account for differences in recorded album
-        # name between the services, and between the versions. For example,
-        # deluxe versions.
+    def get_discography_index(self, artist_id):
+        with self._discography_indexes_lock:
+            discography_index = self._discography_indexes.get(artist_id)
+            if discography_index is not None:
+                self._discography_indexes.move_to_end(artist_id)
+                return discography_index
+
+        discography_info = self.get_artist_discography(artist_id, annotation_limit=DISCOGRAPHY_ANNOTATION_LIMIT)
+        discography_index = DiscographyIndex(discography_info)
+        with self._discography_indexes_lock:
+            self._discography_indexes[artist_id] = discography_index
+            while len(self._discography_indexes) > DISCOGRAPHY_INDEX_CACHE_SIZE:
+                self._discography_indexes.popitem(last=False)
+        return discography_index
+
+    def get_album(self, artist_info, album_name, discography_index=None):
+        discography_index = discography_index or self.get_discography_index(artist_info["pandoraId"])
+
+        album_info = discography_index.find(album_name)
+        if album_info:
+            return album_info
+
+        # Fall back to the search function to account for differences in
+        # recorded album name between the services, and between the versions.
+        # For example, deluxe versions.
         search_result = self.search_album(f"{artist_info['name']} {album_name}", 5)
 
         for album_id in search_result["results"]:
             album_info = search_result["annotations"][album_id]
-            if album_info["pandoraId"] in artist_discography_info["discography"]:
+            if album_info["pandoraId"] in discography_index:
                 return album_info
 
     def get_albums(self, artist_info, album_names):
-        return {album_name: self.get_album(artist_info, album_name) for album_name in album_names}
+        discography_index = self.get_discography_index(artist_info["pandoraId"])
+        return {album_name: self.get_album(artist_info, album_name, discography_index) for album_name in album_names}
+
+    # Fetch every page of a playlist's tracks, returning the track rows, each
+    # with its itemId and trackPandoraId, and the annotations of their tracks.
+    # The first page asks for PLAYLIST_TRACKS_PAGE_SIZE tracks, and however
+    # many the server returns sets the page size for the rest, which are then
+    # fetched concurrently. A short page means the playlist is shorter than
+    # advertised, so no further pages are requested.
+    def get_playlist_track_pages(self, playlist_info, *, workers=DEFAULT_WORKERS):
+        first_page = self.get_playlist_tracks_info(playlist_info, 0, PLAYLIST_TRACKS_PAGE_SIZE)
+        rows = list(first_page["tracks"])
+        annotations = dict(first_page["annotations"])
+
+        playlist_info = {**playlist_info, "version": first_page.get("version", playlist_info["version"])}
+        total_tracks = first_page.get("totalTracks", playlist_info["totalTracks"])
+        page_size = len(rows)
+        if not page_size:
+            return rows, annotations
+
+        offsets = list(range(page_size, total_tracks, page_size))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            # Pages are requested a window at a time, so a short page stops
+            # the requests for the ones after it.
+            for window in chunk(offsets, workers):
+                pages = list(executor.map(lambda offset: self.get_playlist_tracks_info(playlist_info, offset, page_size), window))
+                for page in pages:
+                    rows.extend(page["tracks"])
+                    annotations.update(page["annotations"])
+                if any(len(page["tracks"]) < page_size for page in pages):
+                    break
+
+        return rows, annotations
 
     def get_playlist_track_annotations_all(self, playlist_info):
-        tracks = []
-        while True:
-            tracks_info = self.get_playlist_tracks_info(playlist_info, len(tracks))
-            annotations = tracks_info["annotations"]
-            tracks.extend(annotations[info["trackPandoraId"]] for info in tracks_info["tracks"])
-            if len(tracks) >= playlist_info["totalTracks"]:
-                break
+        rows, annotations = self.get_playlist_track_pages(playlist_info)
+        return [annotations[row["trackPandoraId"]] for row in rows]
 
-        return tracks
+    @staticmethod
+    def _track_row(track, annotations):
+        track_id = track["trackPandoraId"]
+        detail = annotations[track_id]
+        return {
+            "track_id": track_id,
+            "item_id": track["itemId"],
+            "name": detail["name"],
+            "artist": detail["artistName"],
+            "album": detail["albumName"],
+            "duration": detail["duration"],
+        }
 
     def get_playlist_tracks_paginated(self, playlist_info, offset=0, limit=100):
-        tracks = []
         tracks_info = self.get_playlist_tracks_info(playlist_info, offset, limit)
-        for track in tracks_info["tracks"]:
-            track_id = track["trackPandoraId"]
-            detail = tracks_info["annotations"][track_id]
-            tracks.append({
-                "track_id": track_id,
-                "item_id": track["itemId"],
-                "name": detail["name"],
-                "artist": detail["artistName"],
-                "album": detail["albumName"],
-                "duration": detail["duration"],
-            })
-        return tracks
+        return [self._track_row(track, tracks_info["annotations"]) for track in tracks_info["tracks"]]
 
     def get_playlist_tracks(self, playlist_info):
-        tracks = []
-        while True:
-            tracks.extend(self.get_playlist_tracks_paginated(playlist_info, len(tracks)))
-            if len(tracks) >= playlist_info["totalTracks"]:
-                break
-
-        return tracks
+        rows, annotations = self.get_playlist_track_pages(playlist_info)
+        return [self._track_row(track, annotations) for track in rows]
 
     # new_tracklist_ids should be Pandora itemIds, NOT the trackPandoraId.
     def update_playlist(self, playlist_info, new_tracklist_ids):
         current_track_ids = [track["item_id"] for track in self.get_playlist_tracks(playlist_info)]
         new_tracklist_ids = [int(id) for id in new_tracklist_ids]
 
-        moves = []
-        for new_index, item_id in enumerate(new_tracklist_ids):
-            old_index = current_track_ids.index(item_id)
-            if new_index != old_index:
-                moves.append([item_id, old_index, new_index])
+        # Only the tracks outside the longest run already in the right order
+        # are moved. The moves are planned against the full playlist, since the
+        # deletions happen afterwards.
+        moves = plan_index_moves(current_track_ids, new_tracklist_ids)
 
-        deletions = list(set(current_track_ids) - set(new_tracklist_ids))
+        new_tracklist_set = set(new_tracklist_ids)
+        deletions = [item_id for item_id in current_track_ids if item_id not in new_tracklist_set]
 
         # Note the order is important here. Deleting after moving means the
         # move indices don't need to be adjusted.
-        self.playlist_edit(playlist_info, moves)
-        self.playlist_remove(playlist_info, deletions)
+        if moves:
+            playlist_info = self.playlist_edit_bulk(playlist_info, chunk(moves, MAX_MOVES_PER_REQUEST))
+        if deletions:
+            self.playlist_remove(playlist_info, deletions)
 
     # track_ids should be Pandora itemIds, NOT the trackPandoraId.
     def library_add_from_playlist(self, playlist_info, track_ids):
@@ -233,7 +473,7 @@ class Pandora:
             if playlist_track_info["item_id"] in track_ids:
                 to_add.append(playlist_track_info["track_id"])
 
-        self.library_add_bulk(to_add)
+        return self.library_add_bulk(to_add)
 
     def library_get_all(self):
         collection = []
@@ -248,17 +488,70 @@ class Pandora:
 
         return {item["pandoraId"]: item for item in collection}
 
-    def library_get_all_track_ids(self):
+    # The snapshot belongs to whoever the client is logged in as. Without
+    # credentials, the auth token is all there is to go by.
+    def _library_owner(self):
+        user = self._credentials[0] if self._credentials else config_key(self.session.headers.get("X-AuthToken"))
+        return f"pandora:{user}"
+
+    # A cursor to just before the last of the count items listed from cursor,
+    # which ran to the end of the collection. The collection only hands back a
+    # cursor when there's more to list, so one is asked for by listing all but
+    # the last item again.
+    def _library_tail_cursor(self, cursor, count):
+        if count <= 1:
+            return cursor
+        return self.library_get_items(count - 1, cursor=cursor).get("cursor") or cursor
+
+    # The IDs of every item in the library, tracks and albums alike. The
+    # collection is listed oldest first, so after the first full download, a
+    # sync resumes from just before the last item seen, and only that item and
+    # what was added since are downloaded. The snapshot is downloaded in full
+    # again once it's older than LIBRARY_SNAPSHOT_MAX_AGE, or if refresh is
+    # set.
+    def library_snapshot(self, *, refresh=False):
+        snapshot = self.library_store.snapshot(self._library_owner())
+        with snapshot.lock:
+            full_sync = refresh or snapshot.expired(LIBRARY_SNAPSHOT_MAX_AGE)
+            cursor = None if full_sync else snapshot.cursor
+
+            ids = []
+            while True:
+                library = self.library_get_items(10000, cursor=cursor)
+                page_ids = [item["pandoraId"] for item in library["items"]]
+                ids.extend(page_ids)
+                if not library.get("cursor"):
+                    break
+                cursor = library["cursor"]
+            cursor = self._library_tail_cursor(cursor, len(page_ids))
+
+            if full_sync:
+                snapshot.replace(ids, cursor)
+            else:
+                snapshot.add(ids, cursor)
+        return snapshot
+
+    def get_album_track_ids(self, album_id):
+        key = cache_key("album-tracks", {"pandoraId": album_id})
+        track_ids = self.cache.get(key)
+        if track_ids is None:
+            album_details = self.get_details(album_id)
+            track_ids = [info["pandoraId"] for info in album_details["annotations"].values() if info["type"] == "TR"]
+            self.cache.set(key, track_ids, ALBUM_TRACKS_CACHE_TTL)
+        return track_ids
+
+    def library_get_all_track_ids(self, *, workers=DEFAULT_WORKERS):
         collection = self.library_get_all()
-        tracks = set()
-        for item in collection:
-            if item["pandoraType"] == "TR":
-                tracks.add(item["pandoraId"])
-            elif item["pandoraType"] == "AL":
-                album_details = self.get_details(item["pandoraId"])
-                tracks.update({info["pandoraId"] for info in album_details["annotations"].values() if info["type"] == "TR"})
+        tracks = {pandora_id for pandora_id, item in collection.items() if item["pandoraType"] == "TR"}
+        album_ids = [pandora_id for pandora_id, item in collection.items() if item["pandoraType"] == "AL"]
+
+        # Albums already expanded on a previous call come from the cache, so
+        # only newly saved albums cost a request.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for track_ids in executor.map(self.get_album_track_ids, album_ids):
+                tracks.update(track_ids)
         return tracks
 
     def library_contains_tracks(self, track_annotations):
-        library = self.library_get_all()
+        library = self.library_snapshot()
         return {track["pandoraId"]: track["pandoraId"] in library or track.get("albumId") in library for track in track_annotations}
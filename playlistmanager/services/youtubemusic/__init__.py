@@ -1,14 +1,22 @@
+import concurrent.futures
 import json
 import re
+import threading
 
 import requests
 from bs4 import BeautifulSoup
 from ytmusicapi import YTMusic
-
+from ytmusicapi.parsers.playlists import validate_playlist_id
+
+from playlistmanager.albummatch import TitleIndex
+from playlistmanager.cache import DEFAULT_CACHE_DIR, MemoryCache, cache_key, open_cache
+from playlistmanager.clientpool import ClientPool, config_key
+from playlistmanager.library import DEFAULT_MAX_AGE as LIBRARY_SNAPSHOT_MAX_AGE, open_library_store
+from playlistmanager.reorder import plan_successor_moves
+from playlistmanager.services import declared_names
 from ._hooks import *
 
-DISPLAY_NAME = "YouTube Music"
-NAMES = ("ytm", "youtubemusic", "youtube")
+DISPLAY_NAME, NAMES = declared_names(__name__)
 
 
 LINK_CHANNEL_RE = re.compile("https?://www\.youtube\.com\/channel\/(?P<channel>[^/]*)(?!/.*)?")
@@ -28,11 +36,77 @@ _HEADERS = {
 # functionally infinite.
 _ALL = 100000000
 
+CACHE_FILENAME = "youtubemusic.sqlite3"
+# An album's playlist ID doesn't change, so it only expires to keep the cache
+# tidy.
+ALBUM_PLAYLIST_CACHE_TTL = 90 * 24 * 60 * 60
+ALBUM_WORKERS = 4
+# How many album playlists to add to a playlist in a single request, and how
+# long to remember which ones were added so an interrupted build can resume.
+SOURCES_PER_REQUEST = 20
+PLAYLIST_CHECKPOINT_TTL = 30 * 24 * 60 * 60
+
+# Playlists are kept briefly, so a run of operations on the same playlist only
+# downloads it once. Our own edits drop it from the cache. Each entry is a
+# whole playlist, so only the most recently used are kept.
+PLAYLIST_CACHE_TTL = 60
+PLAYLIST_CACHE_ENTRIES = 64
+
+# How many of the most recently added songs to check for ones missing from the
+# library snapshot, growing by LIBRARY_SYNC_GROWTH until a known song is found.
+LIBRARY_SYNC_SONGS = 25
+LIBRARY_SYNC_GROWTH = 4
+
+# Options in the client_config which aren't request headers.
+_CLIENT_OPTIONS = ("cache_dir", "use_cache")
+
+_playlist_cache = MemoryCache(PLAYLIST_CACHE_ENTRIES)
+# The response caches and library stores, one per set of cache options, like
+# the client pool.
+_caches = {}
+_caches_lock = threading.Lock()
+_library_stores = {}
+_library_stores_lock = threading.Lock()
+
+def _client_options(client_config):
+    return {key: client_config[key] for key in _CLIENT_OPTIONS if key in client_config}
+
+def _get_cache(client_config):
+    options = _client_options(client_config)
+    key = config_key(options)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = open_cache(options.get("cache_dir", DEFAULT_CACHE_DIR), options.get("use_cache", True), CACHE_FILENAME)
+        return _caches[key]
+
+def _get_library_store(client_config):
+    options = _client_options(client_config)
+    key = config_key(options)
+    with _library_stores_lock:
+        if key not in _library_stores:
+            _library_stores[key] = open_library_store(options.get("cache_dir", DEFAULT_CACHE_DIR), options.get("use_cache", True))
+        return _library_stores[key]
+
+# The service answered an edit, but didn't apply it.
+class PlaylistSourcesRejected(Exception):
+    pass
+
 def auth_to_config(auth):
     return {"cookie": auth} if auth else {}
 
+def _client_headers(client_config):
+    return {key: value for key, value in client_config.items() if key not in _CLIENT_OPTIONS}
+
+def _create_client(client_config):
+    return YTMusic(auth=json.dumps({**_HEADERS, **_client_headers(client_config)}))
+
+# Constructing a YTMusic parses its headers, starts a session and fetches a
+# visitor ID, so clients are kept between operations. One whose credentials
+# were refused is replaced, so the next operation starts from the config again.
+_clients = ClientPool(_create_client, health_check=lambda ytm: not getattr(ytm, "auth_rejected", False))
+
 def create_client(client_config):
-    return YTMusic(auth=json.dumps({**_HEADERS, **client_config}))
+    return _clients.get(client_config)
 
 
 # Pretty sure I actually don't need to care. It looks like giving a YouTube ID to YouTube Music produces the info I need.
@@ -67,35 +141,96 @@ def _map_yt_id_to_ytm(ytm, yt_id):
 # is added to the playlist instead of just the audio track. When passing the
 # album playlists, this is not the case; they're all audio tracks. As this is
 # the desired behavior, we have to go with the less convenient code.
-def _create_ytm_playlist(ytm, search_name, album_playlist_ids, name_format):
+#
+# ytmusicapi only accepts one source playlist per call, but the underlying
+# edit request takes a list of actions, so several albums can be added at once.
+# The request is built the same way ytmusicapi builds it for one album.
+def _add_playlist_sources(ytm, playlist_id, source_playlist_ids):
+    ytm._check_auth()
+    body = {
+        "playlistId": validate_playlist_id(playlist_id),
+        "actions": [{"action": "ACTION_ADD_PLAYLIST", "addedFullListId": source_id} for source_id in source_playlist_ids]
+    }
+    response = ytm._send_request("browse/edit_playlist", body)
+    if "SUCCEEDED" not in response.get("status", ""):
+        raise PlaylistSourcesRejected(f"Failed to add {len(source_playlist_ids)} albums to playlist {playlist_id}: {response}")
+    return response
+
+# The albums of source_playlist_ids whose tracks are already in the playlist.
+def _sources_in_playlist(ytm, playlist_id, source_playlist_ids):
+    video_ids = {track["videoId"] for track in ytm.get_playlist(playlist_id, limit=_ALL)["tracks"]}
+    return [source_id for source_id in source_playlist_ids
+            if any(track["videoId"] in video_ids for track in ytm.get_playlist(source_id, limit=_ALL)["tracks"])]
+
+def _add_playlist_sources_batched(ytm, playlist_id, source_playlist_ids, checkpoint):
+    for start in range(0, len(source_playlist_ids), SOURCES_PER_REQUEST):
+        batch = source_playlist_ids[start:start + SOURCES_PER_REQUEST]
+        try:
+            _add_playlist_sources(ytm, playlist_id, batch)
+        except PlaylistSourcesRejected:
+            if len(batch) == 1:
+                raise
+
+            # In case the API rejects the combined request, fall back to adding
+            # the albums one at a time, skipping any it added regardless.
+            added_ids = _sources_in_playlist(ytm, playlist_id, batch)
+            checkpoint(added_ids)
+            for source_playlist_id in batch:
+                if source_playlist_id not in added_ids:
+                    _add_playlist_sources(ytm, playlist_id, [source_playlist_id])
+                    checkpoint([source_playlist_id])
+        else:
+            checkpoint(batch)
+
+# Pass the playlist_id of an interrupted build to resume it. Albums recorded
+# as added are skipped. The request in flight when the build was interrupted
+# may have been applied anyway, so the albums it was adding are checked
+# against the playlist first. Without a checkpoint, such as when the cache is
+# disabled, every album is checked against the playlist instead.
+def _create_ytm_playlist(ytm, cache, search_name, album_playlist_ids, name_format, playlist_id=None):
     playlist_name = name_format.format(artist=search_name)
-    playlist_id = ytm.create_playlist(playlist_name, "")
-    for album_playlist_id in album_playlist_ids:
-        ytm.add_playlist_items(playlist_id, source_playlist=album_playlist_id)
-    return playlist_name
-
-def _find_album_by_name(album_info, yt_album_names):
-    album_aliases = {name.lower() for name in [album_info["title"]] + album_info["aliases"]}
+    resuming = bool(playlist_id)
+    playlist_id = validate_playlist_id(playlist_id) if resuming else ytm.create_playlist(playlist_name, "")
 
-    # Check for exact match, first on the title then each alias.
-    for alias in album_aliases:
-        if alias in yt_album_names:
-            return alias
+    checkpoint_key = cache_key("playlist-sources", {"playlistId": playlist_id})
+    checkpointed_ids = cache.get(checkpoint_key)
+    added_ids = checkpointed_ids or []
 
-    # Check if any alias is in the list of YouTube album names. Starts by
-    # checking the entire YouTube list for the full title, then moves on to
-    # aliases.
-    # This is deliberately a separate loop to prioritize any exact match.
-    for alias in album_aliases:
-        for yt_album_name in yt_album_names:
-            if alias in yt_album_name:
-                return yt_album_name
+    def checkpoint(source_playlist_ids):
+        added_ids.extend(source_playlist_ids)
+        cache.set(checkpoint_key, added_ids, PLAYLIST_CHECKPOINT_TTL)
 
-    return None
+    added_id_set = set(added_ids)
+    pending_ids = [source_id for source_id in dict.fromkeys(album_playlist_ids) if source_id not in added_id_set]
+    try:
+        if resuming and pending_ids:
+            unsure_ids = pending_ids if checkpointed_ids is None else pending_ids[:SOURCES_PER_REQUEST]
+            already_added = set(_sources_in_playlist(ytm, playlist_id, unsure_ids))
+            checkpoint(list(already_added))
+            pending_ids = [source_id for source_id in pending_ids if source_id not in already_added]
+        _add_playlist_sources_batched(ytm, playlist_id, pending_ids, checkpoint)
+    except Exception:
+        print(f"Building playlist \"{playlist_name}\" was interrupted. Pass playlist_id=\"{playlist_id}\" to resume it.")
+        raise
+    finally:
+        _playlist_cache.delete(playlist_id)
+    return playlist_name
 
-def _get_yt_artist_discog(ytm, artist_ids, albums_info):
-    album_id_by_name = {}
-    for artist_id in reversed(list(artist_ids)):
+def _find_album_by_name(album_info, yt_album_index):
+    browse_id, _ = yt_album_index.best_match([album_info["title"]] + album_info["aliases"])
+    return browse_id
+
+def _get_album_playlist_id(ytm, cache, browse_id):
+    key = cache_key("album-playlist", {"browseId": browse_id})
+    album_playlist_id = cache.get(key)
+    if album_playlist_id is None:
+        album_playlist_id = ytm.get_album(browse_id)["audioPlaylistId"]
+        cache.set(key, album_playlist_id, ALBUM_PLAYLIST_CACHE_TTL)
+    return album_playlist_id
+
+def _get_yt_artist_discog(ytm, cache, artist_ids, albums_info):
+    unselected_albums = TitleIndex()
+    for artist_id in artist_ids:
         artist_album_summary = ytm.get_artist(artist_id)["albums"]
         album_browse_id = artist_album_summary.get("browseId")
         if album_browse_id:
@@ -103,23 +238,25 @@ def _get_yt_artist_discog(ytm, artist_ids, albums_info):
         else:
             artist_album_list = artist_album_summary["results"]
 
-        album_id_by_name.update({info["title"].lower(): info["browseId"] for info in artist_album_list})
+        for info in artist_album_list:
+            if info["browseId"] not in unselected_albums:
+                unselected_albums.add(info["title"], info["browseId"])
 
-    unselected_albums = list(album_id_by_name.keys())
-    album_playlist_ids = []
-    for info in albums_info:
-        yt_album_name = _find_album_by_name(info, unselected_albums)
-        if not yt_album_name:
-            print(f"Could not find \"{info['title']}\" on YouTube Music. Skipping.")
-            continue
+    with concurrent.futures.ThreadPoolExecutor(max_workers=ALBUM_WORKERS) as executor:
+        album_playlist_futures = []
+        for info in albums_info:
+            yt_album_id = _find_album_by_name(info, unselected_albums)
+            if not yt_album_id:
+                print(f"Could not find \"{info['title']}\" on YouTube Music. Skipping.")
+                continue
 
-        album_playlist_id = ytm.get_album(album_id_by_name[yt_album_name])["audioPlaylistId"]
-        album_playlist_ids.append(album_playlist_id)
+            # Resolve the album in the background while matching the rest.
+            album_playlist_futures.append(executor.submit(_get_album_playlist_id, ytm, cache, yt_album_id))
 
-        # Drop this album name from the search list to prevent duplicates.
-        unselected_albums.remove(yt_album_name)
+            # Drop this album from the search index to prevent duplicates.
+            unselected_albums.discard(yt_album_id)
 
-    return album_playlist_ids
+        return [future.result() for future in album_playlist_futures]
 
 def _extract_channel_id(yt_url):
     yt_page_src = requests.get(yt_url).text
@@ -172,60 +309,96 @@ def search_artists(search_name, client_config={}, *, client=None):
         choices.append({"id": artist_id, "name": result["artist"], "similar": similar_info})
     return choices
 
-def create_discography_playlist(albums_info, artist_links, search_name, client_config, name_format="{artist} Discography"):
-    ytm = create_client(client_config)
+def create_discography_playlist(albums_info, artist_links, search_name, client_config, name_format="{artist} Discography", *, playlist_id=None, client=None):
+    ytm = client or create_client(client_config)
+    cache = _get_cache(client_config)
 
     artist_ids = _get_ytm_artist(ytm, albums_info, artist_links, search_name)
-    album_playlist_ids = _get_yt_artist_discog(ytm, artist_ids, albums_info)
-    return _create_ytm_playlist(ytm, search_name, album_playlist_ids, name_format)
+    album_playlist_ids = _get_yt_artist_discog(ytm, cache, artist_ids, albums_info)
+    return _create_ytm_playlist(ytm, cache, search_name, album_playlist_ids, name_format, playlist_id)
 
-def create_similar_artists_playlist(albums_info_by_artist, search_name, client_config, name_format="{artist} Similar Artists"):
-    ytm = create_client(client_config)
+def create_similar_artists_playlist(albums_info_by_artist, search_name, client_config, name_format="{artist} Similar Artists", *, playlist_id=None, client=None):
+    ytm = client or create_client(client_config)
+    cache = _get_cache(client_config)
 
     album_playlist_ids = []
     for similar_name, info in albums_info_by_artist.items():
         artist_ids = _get_ytm_artist(ytm, info["albums"], info["links"], similar_name)
-        album_playlist_ids.extend(_get_yt_artist_discog(ytm, artist_ids, info["albums"]))
-    return _create_ytm_playlist(ytm, search_name, album_playlist_ids, name_format)
+        album_playlist_ids.extend(_get_yt_artist_discog(ytm, cache, artist_ids, info["albums"]))
+    return _create_ytm_playlist(ytm, cache, search_name, album_playlist_ids, name_format, playlist_id)
 
 
 ##### web app operations #####
-def update_playlist(playlist_id, item_ids, client_config):
+# Work out the removals and moves needed to turn the playlist into item_ids,
+# without making any changes.
+def _plan_playlist_update(playlist_info, item_ids):
+    item_id_set = set(item_ids)
+    to_remove = [track for track in playlist_info["tracks"] if track["setVideoId"] not in item_id_set]
+    remaining_ids = [track["setVideoId"] for track in playlist_info["tracks"] if track["setVideoId"] in item_id_set]
+
+    # Since only one track can move at a time, each move places a track before
+    # its successor in the requested order. Tracks which are already in order
+    # relative to each other are left alone.
+    moves = plan_successor_moves(remaining_ids, list(item_ids))
+    return {
+        "remove": to_remove,
+        "moves": moves,
+        "operations": len(to_remove) + len(moves),
+        "api_calls": (1 if to_remove else 0) + len(moves)
+    }
+
+def update_playlist(playlist_id, item_ids, client_config, *, dry_run=False):
     ytm = create_client(client_config)
 
-    playlist_info = _get_playlist(playlist_id, ytm)
-    if playlist_info:
-        track_ids = [track["setVideoId"] for track in playlist_info["tracks"]]
+    playlist_info = _get_playlist(playlist_id, ytm, client_config)
+    if not playlist_info:
+        return None
 
-        to_remove = []
-        for track in playlist_info["tracks"]:
-            if track["setVideoId"] not in item_ids:
-                to_remove.append(track)
-        if to_remove:
-            ytm.remove_playlist_items(playlist_id, to_remove)
-
-        # Since only one track can move at a time, we must iterate backwards
-        # over the list, inserting the Xth track before the (X-1)th track. And
-        # since the ordering is relative, we only make edits when the requested
-        # playlist differs from the existing one.
-        item_ids = list(reversed(item_ids))
-        for move in zip(item_ids[1:], item_ids[:-1]):  # This zip is an easy way to pair tracks.
-            move_indicies = (track_ids.index(move[0]), track_ids.index(move[1]))
-            if move_indicies[0] > move_indicies[1]:
+    plan = _plan_playlist_update(playlist_info, item_ids)
+    if not dry_run:
+        try:
+            if plan["remove"]:
+                ytm.remove_playlist_items(playlist_id, plan["remove"])
+
+            for move in plan["moves"]:
                 ytm.edit_playlist(playlist_id, moveItem=move)
-                track_ids.insert(move_indicies[1], track_ids.pop(move_indicies[0]))
-                
+        finally:
+            _playlist_cache.delete(playlist_id)
+    return plan
+
+# The video IDs of the songs in the user's library. After the first full
+# download, only the most recently added songs are fetched, until one already
+# in the snapshot turns up. The snapshot is downloaded in full again once it's
+# older than LIBRARY_SNAPSHOT_MAX_AGE, to pick up removed songs.
+def _get_library_snapshot(ytm, client_config, *, refresh=False):
+    snapshot = _get_library_store(client_config).snapshot(f"ytm:{config_key(_client_headers(client_config))}")
+    with snapshot.lock:
+        if refresh or snapshot.expired(LIBRARY_SNAPSHOT_MAX_AGE):
+            snapshot.replace(song["videoId"] for song in ytm.get_library_songs(_ALL))
+            return snapshot
+
+        limit = LIBRARY_SYNC_SONGS
+        while True:
+            songs = ytm.get_library_songs(limit, order="recently_added")
+            new_ids = [song["videoId"] for song in songs if song["videoId"] not in snapshot]
+            if len(new_ids) < len(songs) or len(songs) < limit:
+                break
+            limit *= LIBRARY_SYNC_GROWTH
+        snapshot.add(new_ids)
+    return snapshot
 
 def add_playlist_tracks_to_library(playlist_id, item_ids, client_config):
     ytm = create_client(client_config)
 
-    playlist_info = _get_playlist(playlist_id, ytm)
+    playlist_info = _get_playlist(playlist_id, ytm, client_config)
     if playlist_info:
         to_add = []
         for track in playlist_info["tracks"]:
             if track["setVideoId"] in item_ids:
                 to_add.append(track["feedbackTokens"]["add"])
         ytm.edit_song_library_status(to_add)
+        # The tracks' library status has changed.
+        _playlist_cache.delete(playlist_id)
 
 def get_playlists_info(client_config):
     def get_playlist_stats(entry):
@@ -258,17 +431,25 @@ def get_playlists_info(client_config):
 # isAvailable ensures the track is playable, and thus can be managed.
 # If this filter leaves the playlist empty, None is returned to indicate it
 # cannot be managed.
-def _get_playlist(playlist_id, ytm):
-    # The YouTube Music API doesn't give us much control over playlist
-    # retrieval. While it does have continuation IDs, it only lets us get them
-    # in fixed soize chunks. So rather than guess the playlist length, then
-    # have to issue the same set of requests plus some more, we just issue a
-    # single request to get that info before requesting it all.
-    track_count = ytm.get_playlist(playlist_id, limit=0)["trackCount"]
-    playlist_info = ytm.get_playlist(playlist_id, limit=track_count)
+# Only one user's copy of a playlist is kept, since it includes their library
+# status for each track.
+def _get_playlist(playlist_id, ytm, client_config):
+    owner = config_key(client_config)
+    cached = _playlist_cache.get(playlist_id)
+    if cached and cached[0] == owner:
+        return cached[1]
+
+    # Asking for more tracks than the playlist holds fetches every
+    # continuation in one pass, without having to look up the track count
+    # first.
+    playlist_info = ytm.get_playlist(playlist_id, limit=_ALL)
     original_track_count = len(playlist_info["tracks"])
     playlist_info["tracks"] = [track for track in playlist_info["tracks"] if "setVideoId" in track and track.get("isAvailable")]
-    return playlist_info if playlist_info["tracks"] or original_track_count == 0 else None
+    if not playlist_info["tracks"] and original_track_count:
+        return None
+
+    _playlist_cache.set(playlist_id, (owner, playlist_info), PLAYLIST_CACHE_TTL)
+    return playlist_info
 
 def _parse_track_duration(duration_str):
     # Convert a human-readable duration into seconds (e.g. 3:04 -> 184).
@@ -290,7 +471,7 @@ def get_playlist_info(playlist_id, client_config):
 
     ytm = create_client(client_config)
 
-    playlist_info = _get_playlist(playlist_id, ytm)
+    playlist_info = _get_playlist(playlist_id, ytm, client_config)
     if not playlist_info:
         return None
 
@@ -303,9 +484,9 @@ def get_playlist_info(playlist_id, client_config):
 def get_playlist_tracks_in_library(playlist_id, client_config):
     ytm = create_client(client_config)
 
-    playlist_info = _get_playlist(playlist_id, ytm)
+    playlist_info = _get_playlist(playlist_id, ytm, client_config)
     if not playlist_info:
         return None
 
-    library_tracks = {lib_track["videoId"] for lib_track in ytm.get_library_songs(_ALL)}
+    library_tracks = _get_library_snapshot(ytm, client_config)
     return {track["videoId"]: track["videoId"] in library_tracks for track in playlist_info["tracks"]}
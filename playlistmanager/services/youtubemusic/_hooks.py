@@ -25,3 +25,38 @@ def hook_parse_playlist():
     ytmusicapi.mixins.explore.parse_playlist = parse_playlist
 
 hook_parse_playlist()
+
+
+def hook_send_request():
+    import json
+
+    from ytmusicapi import YTMusic
+
+    from playlistmanager.metrics import metrics
+
+    _orig_send_request = YTMusic._send_request
+
+    # The library raises a bare Exception for any error status, so refused
+    # credentials can only be told apart by its message.
+    auth_rejected_messages = tuple(f"Server returned HTTP {status}:" for status in (401, 403))
+
+    # Every ytmusicapi call goes through _send_request, so timing it gives the
+    # per-endpoint metrics. The library only hands back the parsed response,
+    # so the bytes received are estimated from its JSON size.
+    #
+    # A client whose credentials were refused is marked with auth_rejected, so
+    # it isn't reused.
+    def _send_request(self, endpoint, body, *args, **kwargs):
+        with metrics.time_request("ytmusic", endpoint) as request_info:
+            try:
+                response = _orig_send_request(self, endpoint, body, *args, **kwargs)
+            except Exception as exc:
+                if str(exc).startswith(auth_rejected_messages):
+                    self.auth_rejected = True
+                raise
+            request_info["bytes_received"] = len(json.dumps(response))
+            return response
+
+    YTMusic._send_request = _send_request
+
+hook_send_request()
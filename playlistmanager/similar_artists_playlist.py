@@ -1,3 +1,5 @@
+import concurrent.futures
+
 from playlistmanager import discography_playlist, __version__
 from playlistmanager.musicbrainz import AlbumSorter, Filter, MusicBrainz
 from playlistmanager.services import get_service
@@ -8,8 +10,36 @@ USER_AGENT = f"PlaylistManager/{__version__}"
 def _disambiguate_source_artist(similar_artist_choices):
     return [{**info, "disambiguation": ", ".join(similar["name"] for similar in info["similar"])} for info in similar_artist_choices]
 
-def similar_artists_playlist(service_name, search_name, artist_id, similar_artist_musicbrainz_ids=[], release_filter=Filter.create(), album_sorter=AlbumSorter.create(), client_config={}):
-    musicbrainz = MusicBrainz.connect(USER_AGENT)
+def _get_artist_info(musicbrainz, artist_id, release_filter, album_sorter):
+    artist_info = musicbrainz.get_artist_info(artist_id)
+    return artist_info["name"], {
+        "albums": musicbrainz.get_artist_albums_info(artist_id, release_filter, album_sorter),
+        "links": artist_info["links"]
+    }
+
+# Each artist is resolved independently, so they're fanned out across a
+# thread pool. The MusicBrainz client's rate limiter is shared between the
+# threads, so the overall request rate is unchanged; what overlaps is the
+# latency of each request.
+def _get_artists_info(musicbrainz, artist_ids, release_filter, album_sorter, workers):
+    albums_info_by_artist = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [executor.submit(_get_artist_info, musicbrainz, artist_id, release_filter, album_sorter) for artist_id in artist_ids]
+
+        # Collect in submission order to keep the playlist order stable.
+        for artist_id, future in zip(artist_ids, futures):
+            try:
+                name, info = future.result()
+            except Exception as exc:
+                print(f"Could not load artist {artist_id} from MusicBrainz ({exc}). Skipping.")
+                continue
+
+            albums_info_by_artist[name] = info
+
+    return albums_info_by_artist
+
+def similar_artists_playlist(service_name, search_name, artist_id, similar_artist_musicbrainz_ids=[], release_filter=Filter.create(), album_sorter=AlbumSorter.create(), client_config={}, musicbrainz_config={}, workers=1):
+    musicbrainz = MusicBrainz.connect(USER_AGENT, **musicbrainz_config)
     service = get_service(service_name)
 
     if not similar_artist_musicbrainz_ids:
@@ -22,24 +52,16 @@ def similar_artists_playlist(service_name, search_name, artist_id, similar_artis
             artist_ids.append(similar_artist_musicbrainz["id"])
         similar_artist_musicbrainz_ids = artist_ids.copy()
 
-    albums_info_by_artist = {}
-    for similar_artist_id in similar_artist_musicbrainz_ids:
-        name = musicbrainz.get_artist(similar_artist_id)["name"]
-        albums_info_by_artist[name] = {
-            "albums": musicbrainz.get_artist_albums_info(similar_artist_id, release_filter, album_sorter),
-            "links": musicbrainz.get_artist_links(similar_artist_id)
-        }
+    albums_info_by_artist = _get_artists_info(musicbrainz, similar_artist_musicbrainz_ids, release_filter, album_sorter, workers)
 
     return service.create_similar_artists_playlist(albums_info_by_artist, search_name, client_config)
 
-def similar_artists_playlist_cli(service_name, search_name, match_threshhold, release_filter=Filter.create(), album_sorter=AlbumSorter.create(), auth=None):
+def similar_artists_playlist_cli(service_name, search_name, match_threshhold, release_filter=Filter.create(), album_sorter=AlbumSorter.create(), auth=None, musicbrainz_config={}, workers=1, client_options={}):
     service = get_service(service_name)
-    client_config = service.auth_to_config(auth)
-
-    musicbrainz = MusicBrainz.connect(USER_AGENT)
+    client_config = {**service.auth_to_config(auth), **client_options}
 
     choices = service.search_artists(search_name, client_config)
     choices_with_info = _disambiguate_source_artist(choices)
     artist = discography_playlist._prompt_for_artist(choices_with_info, search_name) if len(choices_with_info) > 1 else choices_with_info[0]
 
-    return similar_artists_playlist(service_name, search_name, artist["id"], release_filter=release_filter, album_sorter=album_sorter, client_config=client_config)
+    return similar_artists_playlist(service_name, search_name, artist["id"], release_filter=release_filter, album_sorter=album_sorter, client_config=client_config, musicbrainz_config=musicbrainz_config, workers=workers)
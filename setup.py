@@ -7,7 +7,7 @@ setup(
     version=__version__,
     author="Austin Noto-Moniz",
     author_email="mathfreak65@gmail.com",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     python_requires=">=3.6",
     install_requires=[
         "requests >= 2.26.0",
@@ -0,0 +1,28 @@
+from playlistmanager.albummatch import TitleIndex, normalize_title
+from playlistmanager.services.pandora.client import DISCOGRAPHY_MATCH_THRESHOLD, DiscographyIndex
+
+
+def test_normalize_title_strips_edition_suffixes():
+    assert normalize_title("Abbey Road (2019 Remaster)") == "abbey road"
+    assert normalize_title("Rock & Roll - Deluxe Edition") == "rock and roll"
+
+def test_exact_match_wins():
+    index = TitleIndex([("Led Zeppelin II", "b"), ("Led Zeppelin", "a")])
+    assert index.best_match(["Led Zeppelin"]) == ("a", 1.0)
+
+def test_sequel_is_not_a_fuzzy_match():
+    index = TitleIndex([("Led Zeppelin II", "b"), ("Led Zeppelin III", "c")])
+    assert index.best_match(["Led Zeppelin"], DISCOGRAPHY_MATCH_THRESHOLD) == (None, 0)
+    assert index.best_match(["Led Zeppelin 2 (Remastered)"])[0] == "b"
+    assert TitleIndex([("Greatest Hits Vol. 3", "c")]).best_match(["Greatest Hits, Vol. 2"]) == (None, 0)
+
+def test_discography_index_falls_back_for_missing_self_titled_album():
+    discography = DiscographyIndex({
+        "discography": ["AL:2"],
+        "annotations": {"AL:2": {"pandoraId": "AL:2", "name": "Led Zeppelin II"}}
+    })
+    assert discography.find("Led Zeppelin") is None
+
+def test_fuzzy_match_tolerates_extra_words():
+    index = TitleIndex([("Abbey Road Super Deluxe Box", "a")])
+    assert index.best_match(["Abbey Road"])[0] == "a"
@@ -0,0 +1,27 @@
+import time
+
+from playlistmanager.cache import MemoryCache
+
+
+def test_memory_cache_drops_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    assert cache.get("a") == 1
+    cache.set("c", 3, 60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["entries"] == 2
+
+def test_memory_cache_drops_expired_entries_on_set(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = MemoryCache()
+    for key in range(10):
+        cache.set(key, key, 60)
+
+    now[0] += 61
+    cache.set("fresh", "value", 60)
+    assert cache.stats()["entries"] == 1
+    assert cache.get("fresh") == "value"
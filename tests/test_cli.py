@@ -0,0 +1,40 @@
+import sys
+
+import pytest
+
+from playlistmanager import cli
+from playlistmanager.cache import NullCache, SqliteCache
+from playlistmanager.services.pandora.client import Pandora
+
+
+class FakeSession:
+    def __init__(self):
+        self.headers = {}
+
+    def head(self, url):
+        return type("Response", (), {"cookies": {"csrftoken": "csrf"}})()
+
+
+def parse(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["cli", *argv])
+    return cli.parse_args()
+
+def connect_pandora(monkeypatch, args):
+    monkeypatch.setattr("requests.Session", FakeSession)
+    return Pandora.connect(auth_token="token", **args["client_options"])
+
+
+def test_no_cache_reaches_the_service_client(monkeypatch, tmp_path):
+    args = parse(monkeypatch, "pandora", "Artist", "--no-cache", "--cache-dir", str(tmp_path))
+    assert args["client_options"] == {"cache_dir": str(tmp_path), "use_cache": False}
+
+    pandora = connect_pandora(monkeypatch, args)
+    assert isinstance(pandora.cache, NullCache)
+    assert not any(tmp_path.iterdir())
+
+def test_cache_dir_reaches_the_service_client(monkeypatch, tmp_path):
+    args = parse(monkeypatch, "pandora", "Artist", "--cache-dir", str(tmp_path))
+
+    pandora = connect_pandora(monkeypatch, args)
+    assert isinstance(pandora.cache, SqliteCache)
+    assert pandora.cache.path.startswith(str(tmp_path))
@@ -0,0 +1,24 @@
+import pytest
+
+from playlistmanager.musicbrainz import AlbumSorter
+
+
+SEARCH_RESULTS = [
+    {"id": "b", "title": "Second", "first-release-date": "1971-11-08", "primary-type": "Album", "secondary-types": ["Live"]},
+    {"id": "none", "title": "Undated"},
+    {"id": "a", "title": "First", "first-release-date": "1969-01-12", "primary-type": "Album"},
+    {"id": "empty", "title": "Empty", "first-release-date": "", "primary-type": None, "secondary-types": []},
+]
+
+@pytest.mark.parametrize("sort_field", list(AlbumSorter.SORT_FIELDS))
+@pytest.mark.parametrize("sort_buffer", [None, 2])
+def test_sorting_tolerates_missing_fields(sort_field, sort_buffer):
+    sorter = AlbumSorter.create(sort_field=sort_field, sort_buffer=sort_buffer)
+    assert len(sorter.sort(SEARCH_RESULTS)) == len(SEARCH_RESULTS)
+    assert len(list(sorter.sort_stream(SEARCH_RESULTS))) == len(SEARCH_RESULTS)
+
+def test_missing_release_dates_sort_like_empty_ones():
+    ids = [album["id"] for album in AlbumSorter.create().sort(SEARCH_RESULTS)]
+    assert ids == ["none", "empty", "a", "b"]
+    ids = [album["id"] for album in AlbumSorter.create(sort_order="desc").sort(SEARCH_RESULTS)]
+    assert ids == ["b", "a", "none", "empty"]
@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+from playlistmanager.musicbrainz import Filter
+from playlistmanager.musicbrainz_offline import EXACT_SCORE, PREFIX_SCORE, WORD_SCORE, OfflineMusicBrainz, import_dumps
+
+
+ARTISTS = [
+    {"id": "zeppelin", "name": "Led Zeppelin", "sort-name": "Led Zeppelin", "aliases": []},
+    {"id": "beatles", "name": "The Beatles", "sort-name": "Beatles, The", "aliases": [{"name": "Beatles"}]},
+    {"id": "bjork", "name": "Björk", "sort-name": "Björk", "aliases": []},
+]
+
+
+class FakeOnline:
+    def __init__(self):
+        self.calls = []
+
+    def _request(self, endpoint, params={}):
+        self.calls.append(("request", endpoint))
+        return {"release-groups": []}
+
+    def lookup(self, resource, id, *, inc=None):
+        self.calls.append(("lookup", resource, id))
+        return {"id": id}
+
+    def search_artist(self, name, threshhold=0):
+        self.calls.append(("search_artist", name))
+        return [{"id": "online", "name": name, "score": 100}]
+
+    def _iter_release_group_pages(self, artist_id, filter_):
+        self.calls.append(("release_groups", artist_id))
+        yield [{"id": "online-release-group"}]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    dump = tmp_path / "artist"
+    dump.write_text("\n".join(json.dumps(artist) for artist in ARTISTS), encoding="utf-8")
+    path = str(tmp_path / "musicbrainz.sqlite3")
+    import_dumps(path, artist_dump=str(dump))
+    return path
+
+
+def scores(results):
+    return {artist["id"]: artist["score"] for artist in results}
+
+def test_search_scores_exact_prefix_and_word_matches(db_path):
+    musicbrainz = OfflineMusicBrainz.open(db_path)
+    assert scores(musicbrainz.search_artist("led zeppelin")) == {"zeppelin": EXACT_SCORE}
+    assert scores(musicbrainz.search_artist("Led Zep")) == {"zeppelin": PREFIX_SCORE}
+    assert scores(musicbrainz.search_artist("zeppelin")) == {"zeppelin": WORD_SCORE}
+    assert scores(musicbrainz.search_artist("beatles")) == {"beatles": EXACT_SCORE}
+    assert musicbrainz.search_artist("zeppelin", threshhold=90) == []
+    assert musicbrainz.search_artist("!!") == []
+
+def test_search_uses_the_full_text_index(db_path):
+    musicbrainz = OfflineMusicBrainz.open(db_path)
+    plan = musicbrainz._query("EXPLAIN QUERY PLAN SELECT artist_id FROM artist_name_search WHERE artist_name_search MATCH ?", ('"zep"*', ))
+    assert any("VIRTUAL TABLE INDEX" in row[-1] for row in plan)
+
+def test_old_databases_get_the_search_index(db_path):
+    musicbrainz = OfflineMusicBrainz.open(db_path)
+    musicbrainz.conn.execute("DELETE FROM artist_name_search")
+    musicbrainz.conn.commit()
+    assert scores(OfflineMusicBrainz.open(db_path).search_artist("björk")) == {"bjork": EXACT_SCORE}
+
+def test_unsupported_requests_fall_back_to_the_online_client(db_path):
+    online = FakeOnline()
+    musicbrainz = OfflineMusicBrainz.open(db_path, online)
+    assert musicbrainz.lookup("artist", "zeppelin")["name"] == "Led Zeppelin"
+    assert musicbrainz.lookup("artist", "missing") == {"id": "missing"}
+    assert musicbrainz.lookup("release", "release-id") == {"id": "release-id"}
+    assert musicbrainz._request("release-group", {"query": "IV"}) == {"release-groups": []}
+    assert online.calls == [("lookup", "artist", "missing"), ("lookup", "release", "release-id"), ("request", "release-group")]
+
+def test_unsupported_requests_raise_without_an_online_client(db_path):
+    musicbrainz = OfflineMusicBrainz.open(db_path)
+    with pytest.raises(ValueError):
+        musicbrainz.lookup("artist", "missing")
+    with pytest.raises(NotImplementedError):
+        musicbrainz.lookup("release", "release-id")
+    with pytest.raises(NotImplementedError):
+        musicbrainz._request("release-group")
+
+def test_reimport_deletes_by_index(db_path):
+    musicbrainz = OfflineMusicBrainz.open(db_path)
+    for sql in ("DELETE FROM artist_name_search WHERE rowid IN (SELECT rowid FROM artist_name WHERE artist_id = ?)",
+                "DELETE FROM artist_name WHERE artist_id = ?",
+                "DELETE FROM release_group_artist WHERE release_group_id = ?"):
+        plan = [row[-1] for row in musicbrainz._query(f"EXPLAIN QUERY PLAN {sql}", ("id", ))]
+        # The full-text table reports a rowid lookup as a scan of "index" =.
+        scans = [step for step in plan if step.startswith("SCAN") and not step.endswith("VIRTUAL TABLE INDEX 0:=")]
+        assert not scans, (sql, plan)
+
+def test_reimport_replaces_search_names(db_path, tmp_path):
+    dump = tmp_path / "renamed"
+    dump.write_text(json.dumps({"id": "zeppelin", "name": "New Yardbirds", "aliases": []}), encoding="utf-8")
+    import_dumps(db_path, artist_dump=str(dump))
+
+    musicbrainz = OfflineMusicBrainz.open(db_path)
+    assert musicbrainz.search_artist("led zeppelin") == []
+    assert scores(musicbrainz.search_artist("new yardbirds")) == {"zeppelin": EXACT_SCORE}
+    assert scores(musicbrainz.search_artist("beatles")) == {"beatles": EXACT_SCORE}
+
+def test_artists_and_release_groups_missing_from_the_database_come_from_online(db_path, tmp_path):
+    dump = tmp_path / "release-group"
+    dump.write_text(json.dumps({"id": "iv", "title": "IV", "primary-type": "Album", "artist-credit": [{"artist": {"id": "zeppelin"}}]}), encoding="utf-8")
+    import_dumps(db_path, release_group_dump=str(dump))
+    online = FakeOnline()
+    musicbrainz = OfflineMusicBrainz.open(db_path, online)
+
+    assert scores(musicbrainz.search_artist("led zeppelin")) == {"zeppelin": EXACT_SCORE}
+    assert scores(musicbrainz.search_artist("Radiohead")) == {"online": 100}
+
+    filter_ = Filter.create()
+    assert [group["id"] for page in musicbrainz._iter_release_group_pages("zeppelin", filter_) for group in page] == ["iv"]
+    assert [group["id"] for page in musicbrainz._iter_release_group_pages("beatles", filter_) for group in page] == ["online-release-group"]
+    assert online.calls == [("search_artist", "Radiohead"), ("release_groups", "beatles")]
@@ -0,0 +1,191 @@
+import pytest
+import requests
+
+from playlistmanager.services.pandora import client as pandora_client
+from playlistmanager.services.pandora.client import Pandora
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers={}):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.content = b"{}"
+        self.headers = headers
+        self.cookies = {"csrftoken": "csrf"}
+        self._body = body if body is not None else {}
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+
+# Answers each POST with handler(endpoint, body), and records the calls.
+class FakeSession:
+    def __init__(self, handler):
+        self.handler = handler
+        self.headers = {}
+        self.calls = []
+
+    def head(self, url):
+        return FakeResponse(200)
+
+    def post(self, url, json):
+        endpoint = url[len(f"{Pandora.BASE_API}/"):]
+        self.calls.append((endpoint, json))
+        return self.handler(endpoint, json)
+
+
+def endpoint_calls(session, endpoint):
+    return [body for called, body in session.calls if called == endpoint]
+
+
+def test_playlist_append_raises_on_persistent_client_error():
+    session = FakeSession(lambda endpoint, body: FakeResponse(400, {"errorCode": 0, "message": "Stale playlistVersion"}))
+    pandora = Pandora(session)
+
+    with pytest.raises(requests.HTTPError):
+        pandora.playlist_append({"pandoraId": "PL:1", "version": 1}, ["AL:1", "AL:2", "AL:3", "AL:4"])
+    assert len(session.calls) == 1
+
+
+def test_playlist_append_stops_shrinking_at_minimum_budget():
+    session = FakeSession(lambda endpoint, body: FakeResponse(413))
+    pandora = Pandora(session)
+
+    with pytest.raises(requests.HTTPError):
+        pandora.playlist_append({"pandoraId": "PL:1", "version": 1}, [f"AL:{num}" for num in range(100)])
+    assert len(session.calls) <= pandora_client.APPEND_MAX_SHRINKS + 1
+    assert pandora._append_track_budget >= pandora_client.APPEND_MIN_TRACKS
+
+
+def test_playlist_append_shrinks_batches_rejected_as_too_large():
+    def handler(endpoint, body):
+        if len(body["itemPandoraIds"]) > 10:
+            return FakeResponse(400, {"errorCode": pandora_client.TOO_LARGE_ERROR_CODES[0]})
+        return FakeResponse(200, {"pandoraId": "PL:1", "version": 2})
+
+    session = FakeSession(handler)
+    result = Pandora(session).playlist_append({"pandoraId": "PL:1", "version": 1}, [f"AL:{num}" for num in range(20)])
+    assert sum(result["batchSizes"]) == 20
+    assert all(size <= 10 for size in result["batchSizes"])
+
+
+def test_token_client_refused_is_unhealthy():
+    session = FakeSession(lambda endpoint, body: FakeResponse(401))
+    pandora = Pandora(session)
+    pandora.session.headers["X-AuthToken"] = "expired"
+    assert pandora.authenticated
+
+    with pytest.raises(requests.HTTPError):
+        pandora.playlist_create("Playlist")
+    assert not pandora.authenticated
+
+
+def test_failed_login_after_expiry_is_unhealthy():
+    def handler(endpoint, body):
+        if endpoint == "v1/auth/login" and session.logins_allowed:
+            return FakeResponse(200, {"authToken": "fresh"})
+        if endpoint == "v1/auth/login" or session.headers["X-AuthToken"] != "fresh":
+            return FakeResponse(401)
+        return FakeResponse(200, {"pandoraId": "PL:1"})
+
+    session = FakeSession(handler)
+    session.logins_allowed = True
+    pandora = Pandora(session)
+    pandora.login("user", "password")
+    assert pandora.playlist_create("Playlist") == {"pandoraId": "PL:1"}
+
+    session.logins_allowed = False
+    session.headers["X-AuthToken"] = "expired"
+    with pytest.raises(requests.HTTPError):
+        pandora.playlist_create("Playlist")
+    assert not pandora.authenticated
+
+    session.logins_allowed = True
+    pandora.login("user", "password")
+    assert pandora.authenticated
+
+
+def test_unhealthy_clients_are_replaced_in_the_pool(monkeypatch):
+    from playlistmanager.services import pandora as pandora_service
+
+    created = []
+    def connect(**client_config):
+        pandora = Pandora(FakeSession(lambda endpoint, body: FakeResponse(401)))
+        pandora.session.headers["X-AuthToken"] = client_config["auth_token"]
+        created.append(pandora)
+        return pandora
+
+    monkeypatch.setattr(Pandora, "connect", staticmethod(connect))
+    pandora_service._clients.clear()
+    try:
+        client = pandora_service.create_client({"auth_token": "token"})
+        assert pandora_service.create_client({"auth_token": "token"}) is client
+        with pytest.raises(requests.HTTPError):
+            client.playlist_create("Playlist")
+        assert pandora_service.create_client({"auth_token": "token"}) is not client
+        assert len(created) == 2
+    finally:
+        pandora_service._clients.clear()
+
+
+def test_discography_indexes_are_bounded(monkeypatch):
+    monkeypatch.setattr(pandora_client, "DISCOGRAPHY_INDEX_CACHE_SIZE", 2)
+    pandora = Pandora(FakeSession(None))
+    fetched = []
+    def get_artist_discography(artist_id, annotation_limit):
+        fetched.append(artist_id)
+        return {"discography": [], "annotations": {}}
+    monkeypatch.setattr(pandora, "get_artist_discography", get_artist_discography)
+
+    for artist_id in ("AR:1", "AR:2", "AR:1", "AR:3", "AR:1", "AR:2"):
+        pandora.get_discography_index(artist_id)
+    assert list(pandora._discography_indexes) == ["AR:1", "AR:2"]
+    assert fetched == ["AR:1", "AR:2", "AR:3", "AR:2"]
+
+
+# Lists the library oldest first, like getItems: the cursor is an offset, and
+# none is handed back once the end is reached.
+def library_handler(library):
+    def handler(endpoint, body):
+        request = body["request"]
+        start = int(request["cursor"] or 0)
+        page = library[start:start + request["limit"]]
+        cursor = str(start + len(page)) if start + len(page) < len(library) else None
+        return FakeResponse(200, {"items": [{"pandoraId": id} for id in page], "cursor": cursor})
+    return handler
+
+@pytest.mark.parametrize("size", [0, 1, 3, 25])
+def test_library_sync_only_lists_new_items(monkeypatch, size):
+    library = [f"TR:{num}" for num in range(size)]
+    session = FakeSession(library_handler(library))
+    pandora = Pandora(session)
+    pandora.session.headers["X-AuthToken"] = "token"
+
+    assert len(pandora.library_snapshot()) == size
+
+    session.calls.clear()
+    returned = []
+    original = pandora.library_get_items
+    def library_get_items(limit=10000, *, cursor=None):
+        result = original(limit, cursor=cursor)
+        returned.extend(item["pandoraId"] for item in result["items"])
+        return result
+    monkeypatch.setattr(pandora, "library_get_items", library_get_items)
+
+    assert len(pandora.library_snapshot()) == size
+    assert len(session.calls) == 1
+    assert returned == library[-1:]
+
+    library.extend(["TR:new1", "TR:new2"])
+    returned.clear()
+    snapshot = pandora.library_snapshot()
+    assert "TR:new1" in snapshot and "TR:new2" in snapshot and len(snapshot) == size + 2
+    assert set(returned) <= {*library[-3:]}
+
+    returned.clear()
+    pandora.library_snapshot()
+    assert returned == ["TR:new2"]
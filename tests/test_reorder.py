@@ -0,0 +1,45 @@
+import random
+
+from playlistmanager.reorder import plan_index_moves, plan_successor_moves
+
+
+def apply_index_moves(items, moves):
+    items = list(items)
+    for item_id, old_index, new_index in moves:
+        assert items[old_index] == item_id
+        del items[old_index]
+        items.insert(new_index, item_id)
+    return items
+
+def apply_successor_moves(items, moves):
+    items = list(items)
+    for item_id, successor_id in moves:
+        items.remove(item_id)
+        items.insert(items.index(successor_id), item_id)
+    return items
+
+
+def test_index_moves_produce_target_order():
+    rand = random.Random(0)
+    for _ in range(500):
+        current = list(range(rand.randrange(40)))
+        rand.shuffle(current)
+        target = rand.sample(current, rand.randrange(len(current) + 1))
+
+        result = apply_index_moves(current, plan_index_moves(current, target))
+        target_set = set(target)
+        assert [item_id for item_id in result if item_id in target_set] == target
+        # Items outside the target keep their relative order.
+        assert [item_id for item_id in result if item_id not in target_set] == [item_id for item_id in current if item_id not in target_set]
+
+def test_index_moves_are_minimal():
+    assert plan_index_moves([1, 2, 3, 4], [1, 2, 3, 4]) == []
+    assert len(plan_index_moves([1, 2, 3, 4], [4, 1, 2, 3])) == 1
+
+def test_successor_moves_produce_target_order():
+    rand = random.Random(1)
+    for _ in range(500):
+        current = list(range(rand.randrange(40)))
+        target = current[:]
+        rand.shuffle(target)
+        assert apply_successor_moves(current, plan_successor_moves(current, target)) == target
@@ -0,0 +1,34 @@
+import subprocess
+import sys
+
+from playlistmanager import services
+
+
+def test_service_map_values_are_packages():
+    from playlistmanager.services import pandora
+
+    assert services.SERVICE_MAP["pandora"] is pandora
+    assert services.SERVICE_MAP.get("pandora") is pandora
+    assert services.SERVICE_MAP.get("napster") is None
+    assert "youtube" in services.SERVICE_MAP
+    assert services.get_service("Pandora") is pandora
+
+def test_service_info_has_package_before_first_access():
+    info = next(info for info in services.supported_services_info() if "pandora" in info["names"])
+    assert "package" in info
+    assert set(info) == {"display", "names", "package"}
+    assert info.get("package") is services.get_service("pandora")
+    assert info.get("missing") is None
+
+def test_packages_match_their_declarations():
+    for info in services.supported_services_info():
+        assert info["package"].DISPLAY_NAME == info["display"]
+        assert info["package"].NAMES == info["names"]
+
+def test_listing_services_imports_no_service_package():
+    code = ("import sys; from playlistmanager.services import SERVICE_MAP, supported_services_info; "
+            "infos = supported_services_info(); names = [name for info in infos for name in info['names']]; "
+            "'ytm' in SERVICE_MAP; list(SERVICE_MAP); "
+            "print(any(name.startswith('playlistmanager.services.') for name in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "False"
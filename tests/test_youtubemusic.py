@@ -0,0 +1,163 @@
+import concurrent.futures
+import json
+
+import pytest
+from ytmusicapi import YTMusic
+
+from playlistmanager.cache import NullCache, SqliteCache
+from playlistmanager.services import youtubemusic
+
+
+def test_cache_follows_client_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(youtubemusic, "_caches", {})
+
+    assert isinstance(youtubemusic._get_cache({"cookie": "a", "use_cache": False}), NullCache)
+    cache = youtubemusic._get_cache({"cookie": "a", "cache_dir": str(tmp_path)})
+    assert isinstance(cache, SqliteCache) and cache.path.startswith(str(tmp_path))
+
+def test_cache_is_opened_once_across_threads(monkeypatch, tmp_path):
+    monkeypatch.setattr(youtubemusic, "_caches", {})
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        caches = list(executor.map(lambda _: youtubemusic._get_cache({"cache_dir": str(tmp_path)}), range(32)))
+    assert len({id(cache) for cache in caches}) == 1
+
+def test_library_store_follows_client_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(youtubemusic, "_library_stores", {})
+
+    assert youtubemusic._get_library_store({"cookie": "a", "use_cache": False}).path == ":memory:"
+    store = youtubemusic._get_library_store({"cookie": "a", "cache_dir": str(tmp_path)})
+    assert store.path.startswith(str(tmp_path))
+    assert youtubemusic._get_library_store({"cookie": "b", "cache_dir": str(tmp_path)}) is store
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        stores = list(executor.map(lambda _: youtubemusic._get_library_store({"cache_dir": str(tmp_path / "other")}), range(32)))
+    assert len({id(store) for store in stores}) == 1
+
+
+# Applies the albums of each edit request up to apply_limit, and rejects the
+# request if there are more.
+class FakeEditClient:
+    def __init__(self, album_tracks, apply_limit=None):
+        self.album_tracks = album_tracks
+        self.apply_limit = apply_limit
+        self.playlist = []
+        self.requests = []
+        self.auth_checks = 0
+
+    def _check_auth(self):
+        self.auth_checks += 1
+
+    def _send_request(self, endpoint, body):
+        self.requests.append(body)
+        sources = [action["addedFullListId"] for action in body["actions"]]
+        for source_id in sources[:self.apply_limit]:
+            self.playlist.extend(self.album_tracks[source_id])
+        if self.apply_limit is not None and len(sources) > self.apply_limit:
+            return {"status": "STATUS_FAILED"}
+        return {"status": "STATUS_SUCCEEDED"}
+
+    def get_playlist(self, playlist_id, limit=100):
+        tracks = self.playlist if playlist_id == "PL1" else self.album_tracks[playlist_id]
+        return {"tracks": [{"videoId": video_id} for video_id in tracks]}
+
+
+def test_add_playlist_sources_strips_browse_prefix_and_checks_auth():
+    ytm = FakeEditClient({"OLAK1": ["v1"]})
+    youtubemusic._add_playlist_sources(ytm, "VLPL1", ["OLAK1"])
+    assert ytm.requests[0]["playlistId"] == "PL1"
+    assert ytm.auth_checks == 1
+
+def test_rejected_batch_does_not_duplicate_applied_albums():
+    album_tracks = {f"OLAK{num}": [f"v{num}a", f"v{num}b"] for num in range(4)}
+    ytm = FakeEditClient(album_tracks, apply_limit=2)
+
+    checkpointed = []
+    youtubemusic._add_playlist_sources_batched(ytm, "PL1", list(album_tracks), checkpointed.extend)
+    assert sorted(ytm.playlist) == sorted(video_id for tracks in album_tracks.values() for video_id in tracks)
+    assert sorted(checkpointed) == sorted(album_tracks)
+
+def test_ambiguous_failure_is_not_retried_album_by_album():
+    class TimingOut(FakeEditClient):
+        def _send_request(self, endpoint, body):
+            super()._send_request(endpoint, body)
+            raise TimeoutError()
+
+    ytm = TimingOut({"OLAK1": ["v1"], "OLAK2": ["v2"]})
+    try:
+        youtubemusic._add_playlist_sources_batched(ytm, "PL1", ["OLAK1", "OLAK2"], lambda ids: None)
+    except TimeoutError:
+        pass
+    assert len(ytm.requests) == 1
+
+
+class FakeResponse:
+    def __init__(self, status_code, reason, body):
+        self.status_code = status_code
+        self.reason = reason
+        self.text = json.dumps(body)
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    def post(self, url, **kwargs):
+        return self.response
+
+def fake_client(client_config, response):
+    ytm = YTMusic(auth=json.dumps({**youtubemusic._HEADERS, "cookie": "__Secure-3PAPISID=sapisid", "x-goog-visitor-id": "visitor"}))
+    ytm._session = FakeSession(response)
+    return ytm
+
+def test_clients_with_refused_credentials_are_replaced(monkeypatch):
+    refused = FakeResponse(401, "Unauthorized", {"error": {"message": "Request had invalid authentication credentials."}})
+    monkeypatch.setattr(youtubemusic._clients, "factory", lambda client_config: fake_client(client_config, refused))
+    youtubemusic._clients.clear()
+    try:
+        ytm = youtubemusic.create_client({"cookie": "cookie"})
+        assert youtubemusic.create_client({"cookie": "cookie"}) is ytm
+        with pytest.raises(Exception, match="HTTP 401"):
+            ytm.get_library_playlists()
+        assert youtubemusic.create_client({"cookie": "cookie"}) is not ytm
+    finally:
+        youtubemusic._clients.clear()
+
+def test_clients_are_kept_after_other_errors(monkeypatch):
+    missing = FakeResponse(404, "Not Found", {"error": {"message": "Requested entity was not found."}})
+    monkeypatch.setattr(youtubemusic._clients, "factory", lambda client_config: fake_client(client_config, missing))
+    youtubemusic._clients.clear()
+    try:
+        ytm = youtubemusic.create_client({"cookie": "cookie"})
+        with pytest.raises(Exception, match="HTTP 404"):
+            ytm.get_library_playlists()
+        assert youtubemusic.create_client({"cookie": "cookie"}) is ytm
+    finally:
+        youtubemusic._clients.clear()
+
+
+def resumed_build(cache, added_count):
+    album_tracks = {f"OLAK{num}": [f"v{num}"] for num in range(youtubemusic.SOURCES_PER_REQUEST * 3)}
+    ytm = FakeEditClient(album_tracks)
+    ytm.playlist = [video_id for source_id in list(album_tracks)[:added_count] for video_id in album_tracks[source_id]]
+    youtubemusic._create_ytm_playlist(ytm, cache, "Artist", list(album_tracks), "{artist}", playlist_id="VLPL1")
+    return ytm, album_tracks
+
+def test_resuming_without_a_checkpoint_checks_every_album():
+    ytm, album_tracks = resumed_build(NullCache(), youtubemusic.SOURCES_PER_REQUEST * 2 + 1)
+    assert sorted(ytm.playlist) == sorted(video_id for tracks in album_tracks.values() for video_id in tracks)
+
+def test_resuming_with_a_checkpoint_only_checks_the_interrupted_request(monkeypatch, tmp_path):
+    cache = SqliteCache(str(tmp_path / "cache.sqlite3"))
+    added = [f"OLAK{num}" for num in range(youtubemusic.SOURCES_PER_REQUEST)]
+    cache.set(youtubemusic.cache_key("playlist-sources", {"playlistId": "PL1"}), added, 60)
+
+    checked = []
+    original = youtubemusic._sources_in_playlist
+    def sources_in_playlist(ytm, playlist_id, source_ids):
+        checked.extend(source_ids)
+        return original(ytm, playlist_id, source_ids)
+    monkeypatch.setattr(youtubemusic, "_sources_in_playlist", sources_in_playlist)
+
+    ytm, album_tracks = resumed_build(cache, youtubemusic.SOURCES_PER_REQUEST + 1)
+    assert len(checked) == youtubemusic.SOURCES_PER_REQUEST
+    assert sorted(ytm.playlist) == sorted(video_id for tracks in album_tracks.values() for video_id in tracks)